@@ -0,0 +1,161 @@
+"""Read-only JSON API of the rankings, for other sites and scripts, under /api/v1.
+
+The endpoints are plain Flask routes, they don't go through the Dash callbacks. Their answers
+are taken from the rankings and trends the dashboard has already computed, the rows of every
+year are put together once per version of the year. The ETag of an answer is the version of
+the data it comes from, so clients revalidate cheaply and get 304 until the data change.
+"""
+import json
+import math
+
+from flask import Blueprint, Response, abort, jsonify, request
+from werkzeug.exceptions import HTTPException, NotFound
+
+# Version of the API in its URLs, raised on incompatible changes of the answers
+API_VERSION = 1
+
+# How long clients and proxies may reuse an answer before revalidating it
+MAX_AGE = 300
+
+# Regions of the top-N endpoint, the same as of the exports
+REGIONS = ('all', 'eu28')
+
+# Number of countries of the top-N endpoint by default, the same as the tables of the dashboard
+TOP = 15
+
+
+def number(value):
+    """Returns the float as JSON allows it, None for NaN."""
+    return None if value is None or math.isnan(value) else value
+
+
+class ApiIndex:
+    """Rows of the ranking of every year of every index, ready to be serialized.
+
+    The rows of a year whose version didn't change are reused from the index of the previous snapshot.
+    """
+
+    def __init__(self, snapshot, previous=None):
+        self.snapshot = snapshot
+        self.rows = {}
+        for key, rankings in snapshot.rankings.items():
+            versions = snapshot.year_versions[key]
+            df = snapshot.data[key]
+            flags = None
+            self.rows[key] = {}
+            for year in rankings.years:
+                reused = previous is not None and previous.snapshot.year_versions.get(key, {}).get(year)
+                if reused is not None and reused == versions.get(year) and year in previous.rows.get(key, {}):
+                    self.rows[key][year] = previous.rows[key][year]
+                    continue
+                if flags is None:
+                    flags = {(int(year), str(code)): int(flag)
+                             for year, code, flag in zip(df['Year'], df['Code'], df['EU28'])}
+                self.rows[key][year] = self._year_rows(rankings, year, flags)
+
+    @staticmethod
+    def _year_rows(rankings, year, flags):
+        """Returns the rows of the year's ranking from the best score and the positions of the EU28 countries."""
+        ranks, scores, percentiles = (values.tolist() for values in rankings.values[year])
+        names = rankings.tables[year][rankings.columns[1]].tolist()
+        rows = [None] * len(ranks)
+        for position, code in enumerate(rankings.codes[year].tolist()):
+            rank = number(ranks[position])
+            rows[position] = {'rank': None if rank is None else int(rank), 'code': code,
+                              'name': str(names[position]), 'score': number(scores[position]),
+                              'percentile': number(percentiles[position])}
+        eu28 = [position for position, row in enumerate(rows) if flags.get((year, row['code'])) == 1]
+        return rows, eu28
+
+    def ranking(self, key, year):
+        """Returns the ranking of the year, raises NotFound for an unknown index or year."""
+        rows, _ = self._year(key, year)
+        return {'index': key, 'year': year, 'countries': rows}
+
+    def top(self, key, year, region, count):
+        """Returns the first countries of the year's ranking in the region, with their rank within it."""
+        rows, eu28 = self._year(key, year)
+        selected = rows if region == 'all' else [rows[position] for position in eu28]
+        countries = [dict(row, region_rank=position + 1) for position, row in enumerate(selected[:count])]
+        return {'index': key, 'year': year, 'region': region, 'countries': countries}
+
+    def country(self, key, code):
+        """Returns the scores and ranks of the country in every year, raises NotFound for an unknown index or country."""
+        trends = self.snapshot.trends.get(key)
+        trend = trends.trend(code) if trends is not None else None
+        if trend is None:
+            raise NotFound('Unknown index or country')
+        years, scores, ranks = trend
+        return {'index': key, 'code': code, 'name': self.snapshot.country_names.get(code),
+                'series': [{'year': int(year), 'score': number(float(score)),
+                            'rank': None if math.isnan(rank) else int(rank)}
+                           for year, score, rank in zip(years, scores, ranks)]}
+
+    def _year(self, key, year):
+        rows = self.rows.get(key, {}).get(year)
+        if rows is None:
+            raise NotFound('Unknown index or year')
+        return rows
+
+    def year_version(self, key, year):
+        return self.snapshot.year_versions[key][year]
+
+    def version(self, key):
+        return self.snapshot.versions[key]
+
+
+def api_response(payload, version):
+    """Serves the payload as JSON with the data version as its ETag, answering 304 when the client has it."""
+    data = json.dumps(payload, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+    response = Response(data, mimetype='application/json')
+    response.set_etag('v{}-{}'.format(API_VERSION, version))
+    response.cache_control.public = True
+    response.cache_control.max_age = MAX_AGE
+    response.headers['Access-Control-Allow-Origin'] = '*'
+    return response.make_conditional(request)
+
+
+def api_blueprint(dashboard):
+    """Creates the routes of the JSON API, answered from the snapshot the dashboard currently uses."""
+    api = Blueprint('api', __name__, url_prefix='/api/v{}'.format(API_VERSION))
+    # Index of the current snapshot, replaced by a single assignment when the data are reloaded
+    indexes = [None]
+
+    def current_index():
+        snapshot = dashboard.snapshot
+        index = indexes[0]
+        if index is None or index.snapshot is not snapshot:
+            index = indexes[0] = ApiIndex(snapshot, index)
+        return index
+
+    @api.errorhandler(HTTPException)
+    def error(e):
+        response = jsonify(error=e.description)
+        response.status_code = e.code
+        return response
+
+    @api.route('/<index>/ranking/<int:year>')
+    def ranking(index, year):
+        """Ranking of all countries of the index in the year."""
+        api_index = current_index()
+        return api_response(api_index.ranking(index, year), api_index.year_version(index, year))
+
+    @api.route('/<index>/top/<int:year>')
+    def top(index, year):
+        """First ?n= countries of the year's ranking in the ?region=, all or eu28."""
+        region = request.args.get('region', 'all')
+        count = request.args.get('n', TOP, type=int)
+        if region not in REGIONS:
+            abort(400, 'Unknown region, use one of: {}'.format(', '.join(REGIONS)))
+        if count < 1:
+            abort(400, 'The number of countries must be positive')
+        api_index = current_index()
+        return api_response(api_index.top(index, year, region, count), api_index.year_version(index, year))
+
+    @api.route('/<index>/country/<code>')
+    def country(index, code):
+        """Scores and ranks of the country in every year of the index, the code in any case like in ?country=."""
+        api_index = current_index()
+        return api_response(api_index.country(index, code.upper()), api_index.version(index))
+
+    return api
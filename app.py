@@ -7,53 +7,355 @@ import plotly.graph_objects as go
 import pandas as pd
 import numpy as np
 import pathlib
+import logging
+import hashlib
+import json
+import os
+import threading
+import time
 
-from dash.dependencies import Input, Output
-from urllib.parse import quote as urlquote
-from flask import Flask, send_from_directory, send_file
+from dash.dependencies import Input, Output, State, ClientsideFunction
+from urllib.parse import quote as urlquote, parse_qs
+from flask import Flask, Response, request
+from plotly.utils import PlotlyJSONEncoder
 
-from generators import generate_table, generate_world_map, generate_europe_map
+from generators import generate_table, generate_map, figure_delta, \
+    generate_ranking_table, table_records, generate_comparison_scatter, generate_rank_differences, generate_trend
+from cache import FigureCache, ResultCache
+from snapshot import dataset_files, load_snapshot, source_stamps
+from datastore import DATA_PATH, STORE_PATH
+from downloads import accepted_encoding, compress, downloads_blueprint
+from prerender import Bundle
+from uncertainty import RankIntervals
+from geometry import geometry_blueprint, geometry_version, graph_config, topojson_name
+from metrics import Metrics, instrument
+from memory import dataset_report
+from api import api_blueprint
+from indices import INDICES
+from rankings import PERCENTILE
 
 external_stylesheets = ['https://codepen.io/chriddyp/pen/bWLwgP.css']
 
+# Short names of countries shown next to their values, other countries are shown with their Czech name
+COUNTRY_LABELS = {'CZE': 'ČR'}
+
+# Shown instead of the values of a country that isn't ranked in the selected year
+MISSING_VALUE = '–'
+
+# Keys of the indices compared with each other in the comparison view
+COMPARED_INDICES = ('un', 'eu')
+
 # Used dataset names
-DATA_UN = 'eGov-t5.csv'
-DATA_EU = 'eur-t3.csv'
+DATA_UN = INDICES['un'].file
+DATA_EU = INDICES['eu'].file
+
+DEFAULT_CONFIG = {
+    # How the year sliders switch years: 'server' recomputes the panel in a callback on every
+    # slider move, 'client' ships all years to the browser once and switches them there
+    'YEAR_SWITCHING': os.environ.get('EGOV_YEAR_SWITCHING', 'server'),
+    # How the server updates a map: 'delta' sends only the data of the new year and lets the browser
+    # keep the rest of the figure, 'full' sends the whole figure including its layout
+    'MAP_UPDATES': os.environ.get('EGOV_MAP_UPDATES', 'delta'),
+    # Load the data and build all figures when the app is created instead of on the first request
+    'WARM_UP': os.environ.get('EGOV_WARM_UP', '0') == '1',
+    # ISO code of the country whose rank, score and percentile are highlighted next to the maps,
+    # a page can choose another one with the ?country= URL parameter
+    'FOCUS_COUNTRY': os.environ.get('EGOV_FOCUS_COUNTRY', 'CZE'),
+    # Keys of the registered indices (see indices.py) shown in panels, in their order on the page
+    'INDICES': os.environ.get('EGOV_INDICES', 'un,eu').split(','),
+    # Folder with the dataset files, e.g. a bigger synthetic one made by synthetic.py for profiling
+    'DATA_DIR': os.environ.get('EGOV_DATA_DIR', str(DATA_PATH)),
+    # Time requests and callbacks and serve the metrics on /metrics
+    'METRICS': os.environ.get('EGOV_METRICS', '1') == '1',
+    # Seconds between checks of the data files for changes, a changed file is loaded without a restart;
+    # 0 turns the checks off
+    'RELOAD_INTERVAL': float(os.environ.get('EGOV_RELOAD_INTERVAL', '0')),
+    # SQLite file with the results of the year callbacks, shared by all workers and kept across restarts;
+    # an empty path turns it off
+    'CALLBACK_CACHE': os.environ.get('EGOV_CALLBACK_CACHE', str(STORE_PATH / 'callbacks.sqlite')),
+    # Seconds a cached callback result is used for
+    'CALLBACK_CACHE_TTL': float(os.environ.get('EGOV_CALLBACK_CACHE_TTL', str(24 * 3600))),
+    # Folder with the panels of all years pre-rendered by prerender.py, they are then only read, not computed
+    'BUNDLE': os.environ.get('EGOV_BUNDLE', ''),
+    # Resolution of the map geometry, 110 or 50 (1:110m or 1:50m): the coarse one is enough for the whole
+    # world, the detailed one is worth its size only in the zoomed Europe map
+    'WORLD_RESOLUTION': int(os.environ.get('EGOV_WORLD_RESOLUTION', '110')),
+    'EUROPE_RESOLUTION': int(os.environ.get('EGOV_EUROPE_RESOLUTION', '50')),
+    # Number of perturbed samples the 95% rank intervals are computed from, 0 turns them off
+    'RANK_SAMPLES': int(os.environ.get('EGOV_RANK_SAMPLES', '1000')),
+    # Folder the rank intervals of every dataset version are kept in, shared by all workers
+    'RANK_INTERVALS': os.environ.get('EGOV_RANK_INTERVALS', str(STORE_PATH / 'intervals')),
+}
+
+logger = logging.getLogger(__name__)
+
+
+def interval_version(snapshot, key):
+    """Returns the version the rank intervals of the index are stored under, indices may share a dataset."""
+    return '{}-{}'.format(key, snapshot.versions[key])
+
+
+class Dashboard:
+    """Data, rankings and figures behind both panels of one app.
+
+    Nothing is loaded when the dashboard is created. The datasets are read and ranked on
+    first use, or up front by warm_up(), e.g. before gunicorn forks its workers.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        # Generated map figures are cached per dataset version and year, shared by all users
+        self.figure_cache = FigureCache()
+        # Results of the year callbacks, shared with the other workers
+        self.callback_cache = ResultCache(config['CALLBACK_CACHE'], config['CALLBACK_CACHE_TTL']) \
+            if config['CALLBACK_CACHE'] else None
+        self.bundle = Bundle(config['BUNDLE']) if config['BUNDLE'] else None
+        # Indices shown, one panel each
+        self.indices = [INDICES[key] for key in config['INDICES']]
+        # Geometry files of the maps, served by the app when they are in the assets
+        self.geometry = list(dict.fromkeys(topojson_name(index.scope, config[index.resolution])
+                                           for index in self.indices))
+        self.graph_config = graph_config(geometry_version(self.geometry))
+        # Rank intervals of every dataset version, shared by the workers through the store
+        self.rank_intervals = RankIntervals(config['RANK_INTERVALS'], config['RANK_SAMPLES']) \
+            if config['RANK_SAMPLES'] else None
+        self._snapshot = None
+        self._layout = None
+        self._layout_payload = None
+        self._dataset_report = None
+        self._lock = threading.Lock()
+        # Process the data watcher runs in, threads don't survive forking of gunicorn workers
+        self._watcher_pid = None
+        self._failed_sources = None
+
+    @property
+    def snapshot(self):
+        if self._snapshot is None:
+            with self._lock:
+                if self._snapshot is None:
+                    self._snapshot = load_snapshot(self.datasets(), self.config['DATA_DIR'])
+        return self._snapshot
+
+    def datasets(self):
+        """Returns the dataset files of the shown indices by their key."""
+        return {index.key: index.file for index in self.indices}
+
+    def focus_country(self, search=None):
+        """Returns the ISO code of the focus country, from the ?country= URL parameter if it names a known country."""
+        codes = parse_qs((search or '').lstrip('?')).get('country')
+        if codes and codes[0].upper() in self.snapshot.country_names:
+            return codes[0].upper()
+        return self.config['FOCUS_COUNTRY']
+
+    def focus_labels(self, code):
+        """Returns the labels of the rank, score and percentile of the country."""
+        name = COUNTRY_LABELS.get(code) or self.snapshot.country_names.get(code, code)
+        return "Pořadí " + name, "Skóre " + name, "Percentil " + name
+
+    def focus_kpis(self, rankings, year, code):
+        """Returns the rank, score and percentile texts of the country in the given year."""
+        country = rankings.country(year, code)
+        if country is None or pd.isna(country[0]):
+            return MISSING_VALUE, MISSING_VALUE, MISSING_VALUE
+        rank, score, percentile = country
+        return str(int(rank)) + ". místo", \
+            str(np.round(float(score), rankings.digits)), \
+            percentile
+
+    def bundled_outputs(self, panel, version, selected_year, country):
+        """Returns the outputs of the panel pre-rendered in the bundle, None without a bundle of the dataset version."""
+        view = self.bundle.view(panel, version, selected_year, self.figure_options(panel)) \
+            if self.bundle is not None else None
+        if view is None:
+            return None
+        kpis = view['kpis'].get(country or self.config['FOCUS_COUNTRY'], (MISSING_VALUE, MISSING_VALUE, MISSING_VALUE))
+        return (view['figure'], view['title'], view['table']) + tuple(kpis)
+
+    def figure_options(self, key):
+        """Returns the configured options the map of the index is drawn with."""
+        return {'resolution': self.config[INDICES[key].resolution]}
+
+    def map_figure(self, snapshot, key, selected_year):
+        """Returns the map of the index in the given year, built once per version of the year's rows."""
+        return self.figure_cache.figure(generate_map, snapshot.data[key],
+                                        snapshot.year_versions[key].get(selected_year), selected_year,
+                                        index=key, **self.figure_options(key))
+
+    def panel_outputs(self, key, selected_year, country=None):
+        """Returns the map, table title, table and country values of the panel of the index for the given year."""
+        snapshot = self.snapshot
+        bundled = self.bundled_outputs(key, snapshot.versions[key], selected_year, country)
+        if bundled is not None:
+            return bundled
+        rankings = snapshot.rankings[key]
+        return (self.map_figure(snapshot, key, selected_year),
+                INDICES[key].table_title + str(selected_year),
+                generate_table(rankings.table(selected_year), 15)) + \
+            self.focus_kpis(rankings, selected_year, country or self.config['FOCUS_COUNTRY'])
+
+    def rank_interval(self, key, selected_year, country=None):
+        """Returns the text of the 95% rank interval of the country in the index, empty until they are computed."""
+        snapshot = self.snapshot
+        intervals = self.rank_intervals.get(interval_version(snapshot, key)) \
+            if self.rank_intervals is not None else None
+        interval = (intervals or {}).get(int(selected_year), {}).get(country or self.config['FOCUS_COUNTRY'])
+        if interval is None:
+            return ''
+        low, high = interval
+        return '95% interval: {}.–{}. místo'.format(low, high) if low != high else 'Pořadí je jisté'
+
+    def compute_rank_intervals(self, snapshot):
+        """Computes the rank intervals of all datasets of the snapshot unless they already are."""
+        if self.rank_intervals is not None:
+            for key, df in snapshot.data.items():
+                self.rank_intervals.compute(interval_version(snapshot, key), df, INDICES[key].value_column)
+
+    def trend_figure(self, key, code):
+        """Returns the chart of the country's scores in the index through all years, of the focus country if unknown."""
+        trends = self.snapshot.trends[key]
+        trend = trends.trend(code)
+        if trend is None:
+            code = self.config['FOCUS_COUNTRY']
+            trend = trends.trend(code)
+        if trend is None:
+            return {}
+        return generate_trend(*trend, self.snapshot.country_names.get(code, code), INDICES[key].label)
+
+    def comparison_figure(self, snapshot, selected_year):
+        """Returns the scatter comparing both indices in the given year."""
+        x, y = COMPARED_INDICES
+        return self.figure_cache.figure(generate_comparison_scatter, snapshot.comparison,
+                                        '{}{}'.format(snapshot.year_versions[x].get(selected_year),
+                                                      snapshot.year_versions[y].get(selected_year)), selected_year,
+                                        x=x, y=y, x_title=INDICES[x].name, y_title=INDICES[y].name)
+
+    def comparison_outputs(self, selected_year):
+        """Returns the scatter of both indices and the table of the biggest rank differences in the given year."""
+        snapshot = self.snapshot
+        x, y = COMPARED_INDICES
+        return self.comparison_figure(snapshot, selected_year), \
+            generate_rank_differences(snapshot.comparison.view(selected_year, x, y), INDICES[x].name, INDICES[y].name)
+
+    def layout(self):
+        """Returns the page layout, built once per snapshot of the data."""
+        snapshot = self.snapshot
+        if self._layout is None or self._layout[0] is not snapshot:
+            self._layout = (snapshot, build_layout(self))
+        return self._layout[1]
+
+    def layout_payload(self, encoding=None):
+        """Returns the layout serialized to JSON and compressed with the encoding, and its ETag.
+
+        The layout is serialized once per snapshot of the data, each compressed variant once on first use.
+        """
+        snapshot = self.snapshot
+        payload = self._layout_payload
+        if payload is None or payload[0] is not snapshot:
+            data = json.dumps(self.layout(), cls=PlotlyJSONEncoder, separators=(',', ':'),
+                              ensure_ascii=False).encode('utf-8')
+            payload = self._layout_payload = (snapshot, hashlib.sha1(data).hexdigest()[:16], {None: data})
+        _, etag, variants = payload
+        if encoding not in variants:
+            variants[encoding] = compress(variants[None], encoding)
+        # Every encoding is a different representation with its own ETag
+        return variants[encoding], etag if encoding is None else '{}-{}'.format(etag, encoding)
+
+    def dataset_memory(self):
+        """Returns the bytes held by the data, rankings and trends of every index, None before the data are loaded.
 
-df = pd.read_csv('data/{}'.format(DATA_UN))
-dfeu = pd.read_csv('data/{}'.format(DATA_EU))
+        The report is computed once per snapshot of the data, scraping the metrics doesn't load the data.
+        """
+        snapshot = self._snapshot
+        if snapshot is None:
+            return None
+        if self._dataset_report is None or self._dataset_report[0] is not snapshot:
+            self._dataset_report = (snapshot, dataset_report(snapshot))
+        return self._dataset_report[1]
 
-filtered_df = pd.DataFrame(df[df.Year == df['Year'].max()], columns=['Czech name', 'UN eGov index'])
-# Adding rank and percentile
-filtered_df['Pořadí'] = filtered_df['UN eGov index'].rank(method='max', ascending=False)
-filtered_df['Percentil'] = filtered_df['UN eGov index'].rank(pct=True)
-filtered_df['Percentil'] = (filtered_df['Percentil'] * 100).round(1).astype(str) + '%'
-filtered_df = filtered_df[['Pořadí', 'Czech name', 'UN eGov index', 'Percentil']]
-filtered_df = filtered_df.rename(columns={'Czech name': 'Země', 'UN eGov index': 'index eGov OSN'})
+    def layout_response(self):
+        """Serves the page layout from its serialized payload, answering 304 when the browser already has it."""
+        encoding = accepted_encoding()
+        data, etag = self.layout_payload(encoding[0] if encoding is not None else None)
+        response = Response(data, mimetype='application/json')
+        response.set_etag(etag)
+        response.headers['Vary'] = 'Accept-Encoding'
+        if encoding is not None:
+            response.headers['Content-Encoding'] = encoding[0]
+        # Browsers keep the layout but ask whether it is still current, it changes when the data are reloaded
+        response.cache_control.no_cache = True
+        return response.make_conditional(request)
 
-filtered_df_eu = pd.DataFrame(dfeu[dfeu.Year == dfeu['Year'].max()], columns=['Czech name', 'EU eGov index'])
-# Adding rank and percentile
-filtered_df_eu['Pořadí'] = filtered_df_eu['EU eGov index'].rank(method='max', ascending=False)
-filtered_df_eu['Percentil'] = filtered_df_eu['EU eGov index'].rank(pct=True)
-filtered_df_eu['Percentil'] = (filtered_df_eu['Percentil'] * 100).round(1).astype(str) + '%'
-filtered_df_eu = filtered_df_eu[['Pořadí', 'Czech name', 'EU eGov index', 'Percentil']]
-filtered_df_eu = filtered_df_eu.rename(columns={'Czech name': 'Země', 'EU eGov index': 'index eGov EU'})
+    def cached_outputs(self, callback, version, selected_year, country, compute):
+        """Returns the outputs of the callback from the shared cache, calling compute(year, country) on a miss."""
+        if self.callback_cache is None:
+            return compute(selected_year, country)
+        return self.callback_cache.get([callback, version, selected_year, country],
+                                       lambda: compute(selected_year, country))
 
-# This is basically here only to use NumPy more than once ¯\_(ツ)_/¯
-df['log of index'] = np.round(np.log(df['UN eGov index']), 2) if not df['UN eGov index'].isnull else 0
+    def build_figures(self, snapshot):
+        """Builds the maps of all years of the snapshot into the figure cache, where unchanged years already are."""
+        for key, rankings in snapshot.rankings.items():
+            for year in rankings.years:
+                self.map_figure(snapshot, key, year)
+        x, y = COMPARED_INDICES
+        for year in snapshot.comparison.years(x, y):
+            self.comparison_figure(snapshot, year)
 
-# Normally, Dash creates its own Flask server internally. By creating our own,
-# we can create a route for downloading files directly:
-server = Flask(__name__)
+    def warm_up(self):
+        """Loads the data, builds the figures of all years, the rank intervals and the layout before the first request."""
+        self.build_figures(self.snapshot)
+        self.compute_rank_intervals(self.snapshot)
+        self.layout_payload()
 
+    def reload(self):
+        """Loads the data files again if they changed and swaps the new snapshot in, returns whether it did.
 
-@server.route("/data/<path:path>")
-def download(path):
-    """Downloads the desired file from the data folder."""
-    return send_file('data/' + path,
-                     mimetype='text/csv',
-                     attachment_filename=path,
-                     as_attachment=True)
+        Requests keep using the current snapshot while the new one is loaded, ranked and its
+        figures built; the swap is a single assignment, so no request sees a half-loaded snapshot.
+        The rank intervals of the new data are computed after the swap, the tables show none until then.
+        """
+        current = self._snapshot
+        if current is None:
+            return False
+        datasets = self.datasets()
+        names = dataset_files(datasets)
+        sources = source_stamps(names, self.config['DATA_DIR'])
+        if sources in (current.sources, self._failed_sources):
+            return False
+        try:
+            snapshot = load_snapshot(datasets, self.config['DATA_DIR'], current)
+        except Exception:
+            # A broken file keeps the current data in use, it is tried again once it changes
+            self._failed_sources = sources
+            raise
+        # A file still being written changes while it is read, it is loaded again on the next check
+        if source_stamps(names, self.config['DATA_DIR']) != snapshot.sources:
+            return False
+        self.build_figures(snapshot)
+        with self._lock:
+            self._snapshot = snapshot
+        logger.info('Data reloaded, versions %s', snapshot.versions)
+        self.compute_rank_intervals(snapshot)
+        return True
+
+    def start_watcher(self):
+        """Starts checking the data files for changes in a background thread, once per process."""
+        interval = self.config['RELOAD_INTERVAL']
+        if not interval or self._watcher_pid == os.getpid():
+            return
+        with self._lock:
+            if self._watcher_pid == os.getpid():
+                return
+            self._watcher_pid = os.getpid()
+        threading.Thread(target=self._watch, args=(interval,), name='data-watcher', daemon=True).start()
+
+    def _watch(self, interval):
+        while True:
+            time.sleep(interval)
+            try:
+                self.reload()
+            except Exception:
+                logger.exception('Reloading the data failed')
 
 
 # Download link generation
@@ -71,564 +373,725 @@ def file_download_link(filename):
     )
 
 
-app = dash.Dash(__name__, external_stylesheets=external_stylesheets, server=server)
+def client_year_views(dashboard, key):
+    """Precomputes the panel of every year in the shape used by the clientside year switch.
+
+    Only the parts of the map that change between years are kept, the rest of the
+    figure stays in the browser. The values and the finished rank intervals of every
+    country are included, so the browser can show the one chosen by the URL parameter.
+    """
+    rankings = dashboard.snapshot.rankings[key]
+    years = {}
+    for year in rankings.years:
+        figure, heading, table = dashboard.panel_outputs(key, int(year))[:3]
+        ranking = table_records(rankings.table(year))
+        for row in ranking:
+            # The native table sorts the percentiles, as numbers they sort by their value
+            row[PERCENTILE] = float(row[PERCENTILE][:-1]) if row[PERCENTILE] else None
+        years[str(year)] = dict(figure_delta(figure),
+                                outputs=[heading, table],
+                                ranking=ranking,
+                                kpis={code: dashboard.focus_kpis(rankings, year, code)
+                                      for code in rankings.codes[year].tolist()},
+                                intervals={code: interval for code, interval in
+                                           ((code, dashboard.rank_interval(key, year, code))
+                                            for code in rankings.codes[year].tolist()) if interval})
+    return {
+        'focus': dashboard.config['FOCUS_COUNTRY'],
+        'countries': sorted(dashboard.snapshot.country_names),
+        'years': years,
+    }
+
+
+def client_year_stores(dashboard):
+    """Creates the stores through which the year dependent map data get to the browser."""
+    if dashboard.config['YEAR_SWITCHING'] == 'client':
+        return [dcc.Store(id=index.years_store, data=client_year_views(dashboard, index.key))
+                for index in dashboard.indices]
+    if dashboard.config['MAP_UPDATES'] == 'delta':
+        return [dcc.Store(id=index.delta_store) for index in dashboard.indices]
+    return []
+
+
+def comparison_section(dashboard):
+    """Builds the comparison of both indices in the latest year they share, nothing if they share none."""
+    x, y = COMPARED_INDICES
+    years = dashboard.snapshot.comparison.years(x, y)
+    if not years:
+        return html.Div()
+    figure, table = dashboard.comparison_outputs(years[-1])
+    return html.Div(
+        [
+            html.Div(
+                [
+                    html.Div(
+                        children=[
+                            html.H3("Srovnání indexů {} a {}".format(INDICES[x].name, INDICES[y].name)),
+                            html.Label(
+                                html.H6('Výběr roku')
+                            ),
+                            dcc.Slider(
+                                id='comparison-year',
+                                min=years[0],
+                                max=years[-1],
+                                value=years[-1],
+                                marks={str(year): str(year) for year in years},
+                                step=None,
+                                className='slider'
+                            ),
+                            dcc.Graph(id='comparison-scatter', figure=figure),
+                        ],
+                        className="pretty_container eight columns",
+                    ),
+                    html.Div(
+                        children=[
+                            html.H4("Největší rozdíly v pořadí"),
+                            html.Div(id='comparison-table', children=[table]),
+                        ],
+                        className="pretty_container four columns",
+                    ),
+                ],
+                className="content_holder row twelve columns flex-display"
+            ),
+        ],
+        className="pretty_container_bg twelve columns",
+    )
+
+
+def un_description():
+    """Describes the UN index, its components and where its data come from."""
+    return html.Div(
+        children=[
+            html.Img(
+                src="https://1000logos.net/wp-content/uploads/2018/01/united-nations-logo.png",
+                draggable='False',
+                id="logo_un",
+                height=150,
+                width='auto',
+            ),
+            html.Div(
+                [
+                    html.H3(
+                        "Index eGovernmentu OSN"
+                    ),
+                    html.P(
+                        "Index rozvoje e-Governmentu (e-Government Development Index; EGDI)"
+                        " je publikovaný Organizací spojených národů od roku 2001. "
+                        "Jde o komplexní ukazatel agregovaný ze tří dílčích "
+                        "hodnot – indexu online služeb (Online Service Index; OSI), indexu "
+                        "telekomunikační infrastruktury (Telecommunication Infrastructure "
+                        "Index; TII) a indexu lidského kapitálu (Human Capital Index; HCI)."
+                        " Konečná hodnota celkového indexu je vypočítána prostým "
+                        "aritmetickým průměrem, tedy pomocí následujícího vzorce:"
+                    ),
+                    html.I("EGDI = ⅓ × (OSI+TII+HCI)"
+                           ),
+                    html.H6(
+                        "Tři dílčí komponenenty indexu jsou definovány následovně:"
+                    ),
+                    html.Ul(
+                        [
+                            html.Li(
+                                "OSI je normalizovaná hodnota mezi 0 a 1, která"
+                                " se rovná rozdílu skutečného celkového skóre země v tomto "
+                                "apektu a nejnižšího celkového skóre dosaženého jakoukoliv"
+                                "zemí, který je vydělen rozsahem všech celkových skóre "
+                                "všech zahrnutých zemí."
+                            ),
+                            html.Li(
+                                [
+                                    "Hodnota TII je pro každou zemi aritmetickým průměrem "
+                                    "následujících parametrů:",
+                                    html.Ul(
+                                        [
+                                            html.Li(
+                                                "Odhad uživatelů internetu na 100 obyvatel;",
+                                            ),
+                                            html.Li(
+                                                "Počet uživatelů mobilní sítě "
+                                                "na 100 obyvatel;"
+                                            ),
+                                            html.Li(
+                                                "Počet aktivních předplatných mobilního "
+                                                "širokopásmového připojení na 100 obyvatel;"
+                                            ),
+                                            html.Li(
+                                                "Počet aktivních předplatných fixního "
+                                                "širokopásmového připojení na 100 obyvatel"
+                                            )
+                                        ]
+                                    )
+                                ]
+                            ),
+                            html.Li(
+                                [
+                                    "Hodnota HCI je pro každou zemi vypočtena pomocí "
+                                    "následujících parametrů:",
+                                    html.Ul(
+                                        [
+                                            html.Li(
+                                                "Míra gramotnosti dospělých;"
+                                            ),
+                                            html.Li(
+                                                "Kombinovaný hrubý poměr primárního, "
+                                                "sekundárního a terciárního vzdělání "
+                                                "v populaci;"
+                                            ),
+                                            html.Li(
+                                                "Očekávaný standardní počet let školní "
+                                                "docházky v zemi;"
+                                            ),
+                                            html.Li(
+                                                "Reálný průměrný počet let školní "
+                                                "docházky v zemi;"
+                                            )
+                                        ]
+                                    )
+                                ]
+                            ),
+                            html.P(
+                                [
+                                    "Další informace k metodologii lze nalézt v ",
+                                    html.A(
+                                        "materiálech publikovaných přímo Organizací "
+                                        "spojených národů",
+                                        href="https://www.un.org/development/desa/"
+                                             "publications/publication/"
+                                             "2020-united-nations-e-government-survey",
+                                        target="_blank",
+                                    ),
+                                    "."
+                                ]
+                            )
+                        ]
+                    )
+                ]
+            )
+        ],
+        id="un_description",
+        className="pretty_container description twelve columns flex-display"
+    )
 
-server = app.server
 
-app.layout = html.Div(
-    children=[
-        html.Div(
-            [
-                html.Div(
-                    [
-                        html.Img(
-                            src='assets/Logo-text.png',
-                            draggable='False',
-                            id="logo",
-                            height='auto',
-                            width=170,
-                        ),
-                        html.Img(
-                            src='https://iss.fsv.cuni.cz/themes/custom/fsv_uk/images/logo.svg',
-                            draggable='False',
-                            id="logo-CUNI-ISS",
-                            height='auto',
-                            width=220,
-                        ),
-                    ],
-                    className="three columns",
-                ),
-                html.Div(
-                    [
-                        html.H3(
-                            "Přehled eGov indexů",
-                            style={"margin-bottom": "0px"},
-                        ),
-                        html.H5(
-                            "Jednoduchý přehled hodnot z indexů eGovernmentu od OSN a EU",
-                            style={"margin-top": "0px"}
-                        ),
-                        html.I(
-                            "Tento web byl vytvořen v rámci diplomové práce Marka Szelese na ISS FSV UK",
-                            style={"margin-top": "0px"}
-                        ),
-
-                    ],
-                    className="eight columns",
-                    id="title",
-                ),
-                html.Div(
-                    [
-                        html.A(
-                            html.Button("Kontaktovat autora", id="contact-button"),
-                            href="mailto:marek.szeles@eforce.cvut.cz",
-                        )
-                    ],
-                    className="two columns",
-                    id="button",
-                ),
-            ],
-            id="header",
-            className="row flex-display",
-            style={"margin-bottom": "25px"},
-        ),
-
-        html.Div(
-            [
-                html.Div(
-                    [
-                        html.Div(
-                            [
-                                html.Div(
-                                    children=[
-                                        html.Img(
-                                            src="https://1000logos.net/wp-content/uploads/2018/01/united-nations-logo.png",
-                                            draggable='False',
-                                            id="logo_un",
-                                            height=150,
-                                            width='auto',
-                                        ),
-                                        html.Div(
+def eu_description():
+    """Describes the EU index, its life events and where its data come from."""
+    return html.Div(
+        children=[
+            html.Img(
+                src="https://ec.europa.eu/info/sites/info/themes/europa/images/svg/logo/logo--en.svg",
+                draggable='False',
+                id="logo_eu",
+                height='auto',
+                width=300,
+            ),
+            html.Div(
+                [
+                    html.H3("Index eGovernmentu EU"),
+                    html.P(
+                        "Index eGovernmentu publikovaný Evropskou unií. Je založený na "
+                        "kvantitativní analýze souboru osmi takzvaných životních událostí."
+                        "Každá životní událost se sestává z uživatelského průchodu, který"
+                        "reprezentuje běžné veřejné služby, které občané a firmy využívají."
+                        "Každý rok je měřena polovina idexu, tedy čtyři životní události, "
+                        "a soubor těchto událostí se ob rok střídá, jak je vidět na "
+                        "následující tabulce. Konečná hodnota indexu pro každou zemi je "
+                        "vypočtena jako prostý průměr celkových hodnot naměřených v rámci "
+                        "životních událostí za poslední dva roky, kdy byl index "
+                        "publikovaný."
+                    ),
+                    html.Table(
+                        [
+
+                            html.Tr(
+                                [
+                                    html.Th(
+                                        ""
+                                    ),
+                                    html.Th(
+                                        [
+                                            html.P(
+                                                "Roky"
+                                            ),
+                                            html.P(
+                                                "2012, 2014, 2016, 2018"
+                                            ),
+                                        ]
+                                    ),
+                                    html.Th(
+                                        [
+                                            html.P(
+                                                "Roky"
+                                            ),
+                                            html.P(
+                                                "2013, 2015, 2017, 2019"
+                                            ),
+                                        ]
+                                    )
+                                ]
+                            ),
+                            html.Tr(
+                                [
+                                    html.Td(
+                                        html.B(
                                             [
-                                                html.H3(
-                                                    "Index eGovernmentu OSN"
-                                                ),
-                                                html.P(
-                                                    "Index rozvoje e-Governmentu (e-Government Development Index; EGDI)"
-                                                    " je publikovaný Organizací spojených národů od roku 2001. "
-                                                    "Jde o komplexní ukazatel agregovaný ze tří dílčích "
-                                                    "hodnot – indexu online služeb (Online Service Index; OSI), indexu "
-                                                    "telekomunikační infrastruktury (Telecommunication Infrastructure "
-                                                    "Index; TII) a indexu lidského kapitálu (Human Capital Index; HCI)."
-                                                    " Konečná hodnota celkového indexu je vypočítána prostým "
-                                                    "aritmetickým průměrem, tedy pomocí následujícího vzorce:"
-                                                ),
-                                                html.I("EGDI = ⅓ × (OSI+TII+HCI)"
-                                                       ),
-                                                html.H6(
-                                                    "Tři dílčí komponenenty indexu jsou definovány následovně:"
-                                                ),
-                                                html.Ul(
-                                                    [
-                                                        html.Li(
-                                                            "OSI je normalizovaná hodnota mezi 0 a 1, která"
-                                                            " se rovná rozdílu skutečného celkového skóre země v tomto "
-                                                            "apektu a nejnižšího celkového skóre dosaženého jakoukoliv"
-                                                            "zemí, který je vydělen rozsahem všech celkových skóre "
-                                                            "všech zahrnutých zemí."
-                                                        ),
-                                                        html.Li(
-                                                            [
-                                                                "Hodnota TII je pro každou zemi aritmetickým průměrem "
-                                                                "následujících parametrů:",
-                                                                html.Ul(
-                                                                    [
-                                                                        html.Li(
-                                                                            "Odhad uživatelů internetu na 100 obyvatel;",
-                                                                        ),
-                                                                        html.Li(
-                                                                            "Počet uživatelů mobilní sítě "
-                                                                            "na 100 obyvatel;"
-                                                                        ),
-                                                                        html.Li(
-                                                                            "Počet aktivních předplatných mobilního "
-                                                                            "širokopásmového připojení na 100 obyvatel;"
-                                                                        ),
-                                                                        html.Li(
-                                                                            "Počet aktivních předplatných fixního "
-                                                                            "širokopásmového připojení na 100 obyvatel"
-                                                                        )
-                                                                    ]
-                                                                )
-                                                            ]
-                                                        ),
-                                                        html.Li(
-                                                            [
-                                                                "Hodnota HCI je pro každou zemi vypočtena pomocí "
-                                                                "následujících parametrů:",
-                                                                html.Ul(
-                                                                    [
-                                                                        html.Li(
-                                                                            "Míra gramotnosti dospělých;"
-                                                                        ),
-                                                                        html.Li(
-                                                                            "Kombinovaný hrubý poměr primárního, "
-                                                                            "sekundárního a terciárního vzdělání "
-                                                                            "v populaci;"
-                                                                        ),
-                                                                        html.Li(
-                                                                            "Očekávaný standardní počet let školní "
-                                                                            "docházky v zemi;"
-                                                                        ),
-                                                                        html.Li(
-                                                                            "Reálný průměrný počet let školní "
-                                                                            "docházky v zemi;"
-                                                                        )
-                                                                    ]
-                                                                )
-                                                            ]
-                                                        ),
-                                                        html.P(
-                                                            [
-                                                                "Další informace k metodologii lze nalézt v ",
-                                                                html.A(
-                                                                    "materiálech publikovaných přímo Organizací "
-                                                                    "spojených národů",
-                                                                    href="https://www.un.org/development/desa/"
-                                                                         "publications/publication/"
-                                                                         "2020-united-nations-e-government-survey",
-                                                                    target="_blank",
-                                                                ),
-                                                                "."
-                                                            ]
-                                                        )
-                                                    ]
-                                                )
+                                                "Události",
+                                                html.Br(),
+                                                "v průmyslu"
                                             ]
                                         )
-                                    ],
-                                    id="un_description",
-                                    className="pretty_container description twelve columns flex-display"
-                                ),
-                            ],
-                            className="content_holder row twelve columns flex-display"
-                        ),
-                        html.Div(
-                            [
-                                html.Div(
-                                    children=[
-                                        html.Label(
-                                            html.H6('Výběr roku')
-                                        ),
-                                        dcc.Slider(
-                                            id='year-slider',
-                                            min=df['Year'].min(),
-                                            max=df['Year'].max(),
-                                            value=df['Year'].max(),
-                                            marks={
-                                                str(year): 'Rok {}'.format(year) if year == df['Year'].min() else str(
-                                                    year)
-                                                for year
-                                                in
-                                                df['Year'].unique()},
-                                            step=None,
-                                            className='slider'
-                                        ),
-
-                                        dcc.Graph(id='world-map-with-slider',
-                                                  figure=generate_world_map(df, df['Year'].max())),
-
-                                    ],
-                                    className="pretty_container ten columns",
-                                ),
-                                html.Div(
-                                    [
-                                        html.Div(
-                                            [
-                                                html.Div(
-                                                    [html.H6(str(int(
-                                                        filtered_df.loc[filtered_df['Země'] == 'Česká republika'][
-                                                            'Pořadí'])) + ". místo", id="un_rank_value"),
-                                                     html.P("Pořadí ČR", id="un_rank_text")],
-                                                    id="un_rank",
-                                                    className="mini_container",
-                                                ),
-                                                html.Div(
-                                                    [html.H6(str(np.round(float(
-                                                        filtered_df.loc[filtered_df['Země'] == 'Česká republika'][
-                                                            'index eGov OSN']), 3)) + "", id="un_score_value"),
-                                                     html.P("Skóre ČR", id="un_score_text")],
-                                                    id="un_score",
-                                                    className="mini_container",
-                                                ),
-                                                html.Div(
-                                                    [html.H6(filtered_df.loc[filtered_df['Země'] == 'Česká republika'][
-                                                                 'Percentil'] + "", id="un_percentile_value"),
-                                                     html.P("Percentil ČR", id="un_percentile_text")],
-                                                    id="un_percentile",
-                                                    className="mini_container",
-                                                ),
-                                            ],
-                                            className="twelve flex-display",
-                                        ),
-                                        html.Div(
-                                            children=[
-                                                html.H4(
-                                                    id='top-un-title',
-                                                    children='TOP 15 zemí světa v roce ' + str(df['Year'].max())),
-                                                html.Div(
-                                                    id='top-un-table',
-                                                    children=[
-                                                        generate_table(filtered_df, 15)
-                                                    ], style={'columnCount': 1}),
-                                                html.Div(
-                                                    children=[
-                                                        file_download_link(DATA_UN)
-                                                    ]
-                                                )
-                                            ],
-                                            className="pretty_container",
-                                        ),
-                                    ],
-                                    className="three columns right-column",
-                                ),
-                            ],
-                            className="content_holder row twelve columns flex-display"
-                        ),
-                    ],
-                    className="pretty_container_bg twelve columns",
-                ),
-            ],
-            className="row flex-display",
-        ),
-
-        html.Div(
-            [
-                html.Div(
-                    [
-                        html.Div(
-                            [
-                                html.Div(
-                                    children=[
-                                        html.Img(
-                                            src="https://ec.europa.eu/info/sites/info/themes/europa/images/svg/logo/logo--en.svg",
-                                            draggable='False',
-                                            id="logo_eu",
-                                            height='auto',
-                                            width=300,
-                                        ),
-                                        html.Div(
+                                    ),
+                                    html.Td(
+                                        "Založení firmy"
+                                    ),
+                                    html.Td(
+                                        "Běžný provoz zavedeného podniku"
+                                    )
+                                ]
+                            ),
+                            html.Tr(
+                                [
+                                    html.Td(
+                                        html.B(
                                             [
-                                                html.H3("Index eGovernmentu EU"),
-                                                html.P(
-                                                    "Index eGovernmentu publikovaný Evropskou unií. Je založený na "
-                                                    "kvantitativní analýze souboru osmi takzvaných životních událostí."
-                                                    "Každá životní událost se sestává z uživatelského průchodu, který"
-                                                    "reprezentuje běžné veřejné služby, které občané a firmy využívají."
-                                                    "Každý rok je měřena polovina idexu, tedy čtyři životní události, "
-                                                    "a soubor těchto událostí se ob rok střídá, jak je vidět na "
-                                                    "následující tabulce. Konečná hodnota indexu pro každou zemi je "
-                                                    "vypočtena jako prostý průměr celkových hodnot naměřených v rámci "
-                                                    "životních událostí za poslední dva roky, kdy byl index "
-                                                    "publikovaný."
-                                                ),
-                                                html.Table(
-                                                    [
-
-                                                        html.Tr(
-                                                            [
-                                                                html.Th(
-                                                                    ""
-                                                                ),
-                                                                html.Th(
-                                                                    [
-                                                                        html.P(
-                                                                            "Roky"
-                                                                        ),
-                                                                        html.P(
-                                                                            "2012, 2014, 2016, 2018"
-                                                                        ),
-                                                                    ]
-                                                                ),
-                                                                html.Th(
-                                                                    [
-                                                                        html.P(
-                                                                            "Roky"
-                                                                        ),
-                                                                        html.P(
-                                                                            "2013, 2015, 2017, 2019"
-                                                                        ),
-                                                                    ]
-                                                                )
-                                                            ]
-                                                        ),
-                                                        html.Tr(
-                                                            [
-                                                                html.Td(
-                                                                    html.B(
-                                                                        [
-                                                                            "Události",
-                                                                            html.Br(),
-                                                                            "v průmyslu"
-                                                                        ]
-                                                                    )
-                                                                ),
-                                                                html.Td(
-                                                                    "Založení firmy"
-                                                                ),
-                                                                html.Td(
-                                                                    "Běžný provoz zavedeného podniku"
-                                                                )
-                                                            ]
-                                                        ),
-                                                        html.Tr(
-                                                            [
-                                                                html.Td(
-                                                                    html.B(
-                                                                        [
-                                                                            "Události",
-                                                                            html.Br(),
-                                                                            "pro občany"
-                                                                        ]
-                                                                    )
-                                                                ),
-                                                                html.Td(
-                                                                    [
-                                                                        "Ztráta a hledání práce",
-                                                                        html.Br(),
-                                                                        "Studium",
-                                                                        html.Br(),
-                                                                        "Rodinný život (od roku 2016)"
-                                                                    ]
-                                                                ),
-                                                                html.Td(
-                                                                    [
-                                                                        "Zahájení řízení o drobných pohledávkách",
-                                                                        html.Br(),
-                                                                        "Stěhování",
-                                                                        html.Br(),
-                                                                        "Vlastnění a využívání automobilu"
-                                                                    ]
-                                                                )
-                                                            ]
-                                                        )
-                                                    ]
-                                                ),
-                                                html.P(
-                                                    "Kromě hlavního indexu jsou v publikacích EU měřeny i jiné "
-                                                    "indikátory, jako například online dostupnost obecných služeb "
-                                                    "státní správy. Tyto indikátory zde nejsou zobrazeny za účelem"
-                                                    "zjednodušení prezentovaných informací, jelikož nejsou přímo"
-                                                    "porovnatelné s daty z druhého indexu od OSN. Jsou ale k nalezení "
-                                                    "v původní dokumentaci spjaté s indexem, na kterou je k dispozici"
-                                                    "odkaz níže."
-                                                ),
-                                                html.P(
-                                                    [
-                                                        "Zmíněné další indikátory a bližší informace k metodologii "
-                                                        "lze nalézt v ",
-                                                        html.A(
-                                                            "materiálech publikovaných přímo orgány "
-                                                            "Evropské unie",
-                                                            href="https://digital-strategy.ec.europa.eu/en/library/"
-                                                                 "egovernment-benchmark-2020-egovernment-works-people",
-                                                            target="_blank",
-                                                        ),
-                                                        "."
-                                                    ]
-                                                )
+                                                "Události",
+                                                html.Br(),
+                                                "pro občany"
                                             ]
                                         )
-                                    ],
-                                    id="eu_description",
-                                    className="pretty_container description twelve columns flex-display"
-                                ),
-                            ],
-                            className="content_holder row twelve columns flex-display"
-                        ),
-                        html.Div(
-                            [
-                                html.Div(
-                                    children=[
-                                        html.Label(
-                                            html.H6('Výběr roku')
-                                        ),
-                                        dcc.Slider(
-                                            id='year-slider-2',
-                                            min=dfeu['Year'].min(),
-                                            max=dfeu['Year'].max(),
-                                            value=dfeu['Year'].max(),
-                                            marks={
-                                                str(year): 'Rok {}'.format(year) if year == df['Year'].min() else str(
-                                                    year) for year in
-                                                dfeu['Year'].unique()},
-                                            step=None,
-                                            className='slider'
-                                        ),
-
-                                        dcc.Graph(id='europe-map-with-slider',
-                                                  figure=generate_europe_map(dfeu, dfeu['Year'].max(), )),
-
-                                    ],
-                                    className="pretty_container ten columns",
-                                ),
-                                html.Div(
-                                    [
-                                        html.Div(
-                                            [
-                                                html.Div(
-                                                    [html.H6(str(int(
-                                                        filtered_df_eu.loc[filtered_df_eu['Země'] == 'Česká republika'][
-                                                            'Pořadí'])) + ". místo", id="eu_rank_value"),
-                                                     html.P("Pořadí ČR", id="eu_rank_text")],
-                                                    id="eu_rank",
-                                                    className="mini_container",
-                                                ),
-                                                html.Div(
-                                                    [html.H6(str(np.round(float(
-                                                        filtered_df_eu.loc[filtered_df_eu['Země'] == 'Česká republika'][
-                                                            'index eGov EU']), 2)), id="eu_score_value"),
-                                                        html.P("Skóre ČR", id="eu_score_text")],
-                                                    id="eu_score",
-                                                    className="mini_container",
-                                                ),
-                                                html.Div(
-                                                    [html.H6(
-                                                        filtered_df_eu.loc[filtered_df_eu['Země'] == 'Česká republika'][
-                                                            'Percentil'] + "", id="eu_percentile_value"),
-                                                        html.P("Percentil ČR", id="eu_percentile_text")],
-                                                    id="eu_percentile",
-                                                    className="mini_container",
-                                                ),
-                                            ],
-                                            className="twelve flex-display",
-                                        ),
-                                        html.Div(
-                                            children=[
-                                                html.H4(
-                                                    id='top-eu-title',
-                                                    children='TOP 15 zemí EU v roce ' + str(dfeu['Year'].max())),
-                                                html.Div(
-                                                    id='top-eu-table',
-                                                    children=[
-                                                        generate_table(filtered_df, 15)
-                                                    ], style={'columnCount': 1}),
-                                                html.Div(
-                                                    children=[
-                                                        file_download_link(DATA_EU)
-                                                    ]
-                                                )
-                                            ],
-                                            className="pretty_container",
-                                        ),
-                                    ],
-                                    className="three columns right-column",
-                                ),
-                            ],
-                            className="content_holder row twelve columns flex-display"
-                        ),
-                    ],
-                    className="pretty_container_bg twelve columns",
-                ),
-            ],
-            className="row flex-display",
-        ),
-
-    ],
-    id="mainContainer",
-    style={'columnCount': 1, "display": "flex", "flex-direction": "column"},
-)
-
-app.title = 'eGovernment benchmark'
-
-
-@app.callback(
-    [Output('world-map-with-slider', 'figure'),
-     Output('top-un-title', 'children'),
-     Output('top-un-table', 'children'),
-     Output('un_rank_value', 'children'),
-     Output('un_score_value', 'children'),
-     Output('un_percentile_value', 'children')
-     ],
-    [Input('year-slider', 'value')])
-def update_world_map(selected_year):
-    filtered_df = pd.DataFrame(df[df.Year == selected_year], columns=['Czech name', 'UN eGov index'])
-    filtered_df['Pořadí'] = filtered_df['UN eGov index'].rank(method='max', ascending=False)
-    filtered_df['Percentil'] = filtered_df['UN eGov index'].rank(pct=True)
-    filtered_df['Percentil'] = (filtered_df['Percentil'] * 100).round(1).astype(str) + '%'
-    filtered_df = filtered_df[['Pořadí', 'Czech name', 'UN eGov index', 'Percentil']]
-    filtered_df = filtered_df.rename(columns={'Czech name': 'Země', 'UN eGov index': 'index eGov OSN'})
-    return generate_world_map(df, selected_year), \
-           'TOP 15 zemí světa v roce ' + str(selected_year), \
-           generate_table(filtered_df, 15), \
-           str(int(filtered_df.loc[filtered_df['Země'] == 'Česká republika']['Pořadí'])) + ". místo", \
-           str(np.round(float(filtered_df.loc[filtered_df['Země'] == 'Česká republika']['index eGov OSN']), 3)) + "", \
-           filtered_df.loc[filtered_df['Země'] == 'Česká republika']['Percentil']
-
-
-@app.callback(
-    [Output('europe-map-with-slider', 'figure'),
-     Output('top-eu-title', 'children'),
-     Output('top-eu-table', 'children'),
-     Output('eu_rank_value', 'children'),
-     Output('eu_score_value', 'children'),
-     Output('eu_percentile_value', 'children')],
-    [Input('year-slider-2', 'value')])
-def update_europe_map(selected_year):
-    filtered_df_eu = pd.DataFrame(dfeu[dfeu.Year == selected_year], columns=['Czech name', 'EU eGov index'])
-    filtered_df_eu['Pořadí'] = filtered_df_eu['EU eGov index'].rank(method='max', ascending=False)
-    filtered_df_eu['Percentil'] = filtered_df_eu['EU eGov index'].rank(pct=True)
-    filtered_df_eu['Percentil'] = (filtered_df_eu['Percentil'] * 100).round(1).astype(str) + '%'
-    filtered_df_eu = filtered_df_eu[['Pořadí', 'Czech name', 'EU eGov index', 'Percentil']]
-    filtered_df_eu = filtered_df_eu.rename(columns={'Czech name': 'Země', 'EU eGov index': 'index eGov EU'})
-    filtered_df_eu = filtered_df_eu.sort_values('index eGov EU', ascending=False)
-    return generate_europe_map(dfeu, selected_year), \
-           'TOP 15 zemí EU v roce ' + str(selected_year), \
-           generate_table(filtered_df_eu, 15), \
-           str(int(filtered_df_eu.loc[filtered_df_eu['Země'] == 'Česká republika']['Pořadí'])) + ". místo", \
-           str(np.round(float(filtered_df_eu.loc[filtered_df_eu['Země'] == 'Česká republika']['index eGov EU']), 2)), \
-           filtered_df_eu.loc[filtered_df_eu['Země'] == 'Česká republika']['Percentil']
+                                    ),
+                                    html.Td(
+                                        [
+                                            "Ztráta a hledání práce",
+                                            html.Br(),
+                                            "Studium",
+                                            html.Br(),
+                                            "Rodinný život (od roku 2016)"
+                                        ]
+                                    ),
+                                    html.Td(
+                                        [
+                                            "Zahájení řízení o drobných pohledávkách",
+                                            html.Br(),
+                                            "Stěhování",
+                                            html.Br(),
+                                            "Vlastnění a využívání automobilu"
+                                        ]
+                                    )
+                                ]
+                            )
+                        ]
+                    ),
+                    html.P(
+                        "Kromě hlavního indexu jsou v publikacích EU měřeny i jiné "
+                        "indikátory, jako například online dostupnost obecných služeb "
+                        "státní správy. Tyto indikátory zde nejsou zobrazeny za účelem"
+                        "zjednodušení prezentovaných informací, jelikož nejsou přímo"
+                        "porovnatelné s daty z druhého indexu od OSN. Jsou ale k nalezení "
+                        "v původní dokumentaci spjaté s indexem, na kterou je k dispozici"
+                        "odkaz níže."
+                    ),
+                    html.P(
+                        [
+                            "Zmíněné další indikátory a bližší informace k metodologii "
+                            "lze nalézt v ",
+                            html.A(
+                                "materiálech publikovaných přímo orgány "
+                                "Evropské unie",
+                                href="https://digital-strategy.ec.europa.eu/en/library/"
+                                     "egovernment-benchmark-2020-egovernment-works-people",
+                                target="_blank",
+                            ),
+                            "."
+                        ]
+                    )
+                ]
+            )
+        ],
+        id="eu_description",
+        className="pretty_container description twelve columns flex-display"
+    )
+
+
+# Descriptions at the top of the panels of the indices, other indices show only their title
+DESCRIPTIONS = {'un': un_description, 'eu': eu_description}
+
 
+def index_description(index):
+    """Returns the description at the top of the panel of the index, only its title if it has none."""
+    if index.key in DESCRIPTIONS:
+        return DESCRIPTIONS[index.key]()
+    return html.Div(
+        [html.H3(index.title)],
+        id=index.key + "_description",
+        className="pretty_container description twelve columns flex-display"
+    )
+
+
+def index_panel(dashboard, index):
+    """Builds the panel of the index showing its latest year: map, trend, focus country, top 15 and full ranking."""
+    key = index.key
+    df = dashboard.snapshot.data[key]
+    rankings = dashboard.snapshot.rankings[key]
+    panel = dashboard.panel_outputs(key, rankings.latest())
+    labels = dashboard.focus_labels(dashboard.config['FOCUS_COUNTRY'])
+
+    return html.Div(
+        [
+            html.Div(
+                [
+                    html.Div(
+                        [
+                            index_description(index),
+                        ],
+                        className="content_holder row twelve columns flex-display"
+                    ),
+                    html.Div(
+                        [
+                            html.Div(
+                                children=[
+                                    html.Label(
+                                        html.H6('Výběr roku')
+                                    ),
+                                    dcc.Slider(
+                                        id=index.slider,
+                                        min=df['Year'].min(),
+                                        max=df['Year'].max(),
+                                        value=df['Year'].max(),
+                                        marks={
+                                            str(year): 'Rok {}'.format(year) if year == df['Year'].min() else str(
+                                                year) for year in df['Year'].unique()},
+                                        step=None,
+                                        className='slider'
+                                    ),
+
+                                    dcc.Graph(id=index.graph,
+                                              figure=panel[0],
+                                              config=dashboard.graph_config),
+                                    html.P("Kliknutím na zemi v mapě zobrazíte vývoj jejího indexu."),
+                                    dcc.Graph(id=index.trend,
+                                              figure=dashboard.trend_figure(key, dashboard.config['FOCUS_COUNTRY'])),
+
+                                ],
+                                className="pretty_container ten columns",
+                            ),
+                            html.Div(
+                                [
+                                    html.Div(
+                                        [
+                                            html.Div(
+                                                [html.H6(panel[3], id=index.kpis[0] + '_value'),
+                                                 html.P(labels[0], id=index.kpis[0] + '_text'),
+                                                 html.P(dashboard.rank_interval(key, rankings.latest()),
+                                                        id=index.interval, className="rank-interval")],
+                                                id=index.kpis[0],
+                                                className="mini_container",
+                                            ),
+                                            html.Div(
+                                                [html.H6(panel[4], id=index.kpis[1] + '_value'),
+                                                 html.P(labels[1], id=index.kpis[1] + '_text')],
+                                                id=index.kpis[1],
+                                                className="mini_container",
+                                            ),
+                                            html.Div(
+                                                [html.H6(panel[5], id=index.kpis[2] + '_value'),
+                                                 html.P(labels[2], id=index.kpis[2] + '_text')],
+                                                id=index.kpis[2],
+                                                className="mini_container",
+                                            ),
+                                        ],
+                                        className="twelve flex-display",
+                                    ),
+                                    html.Div(
+                                        children=[
+                                            html.H4(
+                                                id=index.top_title,
+                                                children=panel[1]),
+                                            html.Div(
+                                                id=index.top_table,
+                                                children=[
+                                                    panel[2]
+                                                ], style={'columnCount': 1}),
+                                            html.Div(
+                                                children=[
+                                                    file_download_link(index.file)
+                                                ]
+                                            )
+                                        ],
+                                        className="pretty_container",
+                                    ),
+                                ],
+                                className="three columns right-column",
+                            ),
+                        ],
+                        className="content_holder row twelve columns flex-display"
+                    ),
+                    html.Div(
+                        [
+                            html.Div(
+                                children=[
+                                    html.H4("Kompletní pořadí"),
+                                    generate_ranking_table(index.ranking_table, rankings.columns,
+                                                           native=dashboard.config['YEAR_SWITCHING'] == 'client'),
+                                ],
+                                className="pretty_container twelve columns",
+                            ),
+                        ],
+                        className="content_holder row twelve columns flex-display"
+                    ),
+                ],
+                className="pretty_container_bg twelve columns",
+            ),
+        ],
+        className="row flex-display",
+    )
+
+
+def build_layout(dashboard):
+    """Builds the page with the panels of all shown indices, each showing the latest year of its dataset."""
+    return html.Div(
+        children=[
+            html.Div(
+                [
+                    html.Div(
+                        [
+                            html.Img(
+                                src='assets/Logo-text.png',
+                                draggable='False',
+                                id="logo",
+                                height='auto',
+                                width=170,
+                            ),
+                            html.Img(
+                                src='https://iss.fsv.cuni.cz/themes/custom/fsv_uk/images/logo.svg',
+                                draggable='False',
+                                id="logo-CUNI-ISS",
+                                height='auto',
+                                width=220,
+                            ),
+                        ],
+                        className="three columns",
+                    ),
+                    html.Div(
+                        [
+                            html.H3(
+                                "Přehled eGov indexů",
+                                style={"margin-bottom": "0px"},
+                            ),
+                            html.H5(
+                                "Jednoduchý přehled hodnot z indexů eGovernmentu od OSN a EU",
+                                style={"margin-top": "0px"}
+                            ),
+                            html.I(
+                                "Tento web byl vytvořen v rámci diplomové práce Marka Szelese na ISS FSV UK",
+                                style={"margin-top": "0px"}
+                            ),
+
+                        ],
+                        className="eight columns",
+                        id="title",
+                    ),
+                    html.Div(
+                        [
+                            html.A(
+                                html.Button("Kontaktovat autora", id="contact-button"),
+                                href="mailto:marek.szeles@eforce.cvut.cz",
+                            )
+                        ],
+                        className="two columns",
+                        id="button",
+                    ),
+                ],
+                id="header",
+                className="row flex-display",
+                style={"margin-bottom": "25px"},
+            ),
+
+            *[index_panel(dashboard, index) for index in dashboard.indices],
+
+            comparison_section(dashboard),
+            dcc.Location(id='url', refresh=False),
+            html.Div(client_year_stores(dashboard), id="year-stores"),
+        ],
+        id="mainContainer",
+        style={'columnCount': 1, "display": "flex", "flex-direction": "column"},
+    )
+
+
+def index_outputs(index):
+    """Returns the outputs of the year callback of the panel of the index: map, top 15 title and table, values."""
+    return [Output(index.graph, 'figure'),
+            Output(index.top_title, 'children'),
+            Output(index.top_table, 'children')] + \
+        [Output(kpi + '_value', 'children') for kpi in index.kpis]
+
+
+def register_year_callbacks(app, index):
+    """Registers the callbacks switching the year of the panel of the index, according to the configured mode.
+
+    The server side callbacks are cached under the version of the year's rows and the options of the map,
+    the cache is shared with apps that may be configured differently.
+    """
+    dashboard = app.dashboard
+    config = dashboard.config
+    outputs = index_outputs(index)
+    graph, years_store, delta_store = index.graph, index.years_store, index.delta_store
+    inputs = [Input(index.slider, 'value'), Input('url', 'search')]
+
+    def panel_outputs(selected_year, country):
+        return dashboard.panel_outputs(index.key, selected_year, country)
+
+    def version(selected_year):
+        return [dashboard.snapshot.year_versions[index.key].get(selected_year), dashboard.figure_options(index.key)]
+
+    if config['YEAR_SWITCHING'] == 'client':
+        # All years are already in the page, the browser swaps them without asking the server
+        app.clientside_callback(
+            ClientsideFunction(namespace='egov', function_name='switch_year'),
+            outputs,
+            inputs,
+            [State(years_store, 'data'), State(graph, 'figure')])
+        return
+
+    if config['MAP_UPDATES'] == 'delta':
+        # The server sends only the new map data, the browser merges them into the shown figure
+        app.clientside_callback(
+            ClientsideFunction(namespace='egov', function_name='apply_map_delta'),
+            outputs[0],
+            [Input(delta_store, 'data')],
+            [State(graph, 'figure')])
+
+        def map_delta_outputs(selected_year, country):
+            figure, *panel = panel_outputs(selected_year, country)
+            return [figure_delta(figure)] + panel
+
+        @app.callback([Output(delta_store, 'data')] + outputs[1:], inputs)
+        def update_map_delta(selected_year, search):
+            return dashboard.cached_outputs(delta_store, version(selected_year), selected_year,
+                                            dashboard.focus_country(search), map_delta_outputs)
+        return
+
+    @app.callback(outputs, inputs)
+    def update_map(selected_year, search):
+        return dashboard.cached_outputs(graph, version(selected_year), selected_year, dashboard.focus_country(search),
+                                        panel_outputs)
+
+
+def register_focus_callbacks(app):
+    """Registers the callback labelling the values of the country chosen by the URL parameter in all panels."""
+    indices = app.dashboard.indices
+
+    @app.callback([Output(kpi + '_text', 'children') for index in indices for kpi in index.kpis],
+                  [Input('url', 'search')])
+    def update_focus_labels(search):
+        return app.dashboard.focus_labels(app.dashboard.focus_country(search)) * len(indices)
+
+
+def register_trend_callbacks(app, index):
+    """Registers the callback showing the trend of the country clicked in the map, or of the URL's focus country."""
+    @app.callback(Output(index.trend, 'figure'), [Input(index.graph, 'clickData'), Input('url', 'search')])
+    def update_trend(click_data, search):
+        points = (click_data or {}).get('points') or [{}]
+        code = points[0].get('location') or app.dashboard.focus_country(search)
+        return app.dashboard.trend_figure(index.key, code)
+
+
+def register_interval_callbacks(app, index):
+    """Registers the callback showing the rank interval of the focus country in the selected year.
+
+    With the years switched in the browser, the browser takes the interval from the page instead.
+    """
+    if app.dashboard.config['YEAR_SWITCHING'] == 'client':
+        app.clientside_callback(
+            ClientsideFunction(namespace='egov', function_name='switch_interval'),
+            Output(index.interval, 'children'),
+            [Input(index.slider, 'value'), Input('url', 'search')],
+            [State(index.years_store, 'data')])
+        return
+
+    @app.callback(Output(index.interval, 'children'), [Input(index.slider, 'value'), Input('url', 'search')])
+    def update_rank_interval(selected_year, search):
+        return app.dashboard.rank_interval(index.key, selected_year, app.dashboard.focus_country(search))
+
+
+def register_comparison_callbacks(app):
+    """Registers the callback switching the year of the comparison of both indices."""
+    @app.callback([Output('comparison-scatter', 'figure'), Output('comparison-table', 'children')],
+                  [Input('comparison-year', 'value')])
+    def update_comparison(selected_year):
+        return app.dashboard.comparison_outputs(selected_year)
+
+
+def register_ranking_callbacks(app, index):
+    """Registers the callback sending the requested page of the complete ranking, sorted from the precomputed order.
+
+    With the years switched in the browser, the browser takes the whole ranking of the year from the page instead.
+    """
+    table_id = index.ranking_table
+    if app.dashboard.config['YEAR_SWITCHING'] == 'client':
+        app.clientside_callback(
+            ClientsideFunction(namespace='egov', function_name='switch_ranking'),
+            Output(table_id, 'data'),
+            [Input(index.slider, 'value')],
+            [State(index.years_store, 'data')])
+        return
+
+    def rankings():
+        return app.dashboard.snapshot.rankings[index.key]
+
+    @app.callback([Output(table_id, 'data'), Output(table_id, 'page_count')],
+                  [Input(index.slider, 'value'),
+                   Input(table_id, 'page_current'),
+                   Input(table_id, 'page_size'),
+                   Input(table_id, 'sort_by')])
+    def update_ranking_page(selected_year, page_current, page_size, sort_by):
+        sort = sort_by[0] if sort_by else {}
+        page = rankings().page(selected_year, page_current, page_size,
+                               sort.get('column_id'), sort.get('direction') == 'desc')
+        return table_records(page), rankings().page_count(selected_year, page_size)
+
+
+def create_app(config=None):
+    """Creates the dashboard app; the data are loaded on first use unless the WARM_UP option is set."""
+    config = dict(DEFAULT_CONFIG, **(config or {}))
+    dashboard = Dashboard(config)
+
+    # Normally, Dash creates its own Flask server internally. By creating our own,
+    # we can create routes for downloading files directly:
+    server = Flask(__name__)
+    server.register_blueprint(downloads_blueprint(dashboard))
+    server.register_blueprint(geometry_blueprint(dashboard.geometry))
+    server.register_blueprint(api_blueprint(dashboard))
+    if config['METRICS']:
+        instrument(server, dashboard, Metrics())
+
+    # The layout is a function so that it is built on the first page load, not when the app is created.
+    # Callbacks therefore refer to components that don't exist yet, which Dash must not reject.
+    app = dash.Dash(__name__, external_stylesheets=external_stylesheets, server=server,
+                    suppress_callback_exceptions=True)
+    app.dashboard = dashboard
+    app.title = 'eGovernment benchmark'
+    app.layout = dashboard.layout
+    # Dash would serialize the layout on every page load, it is served from the payload serialized once instead
+    server.view_functions[app.config.routes_pathname_prefix + '_dash-layout'] = dashboard.layout_response
+
+    for index in dashboard.indices:
+        register_year_callbacks(app, index)
+        register_ranking_callbacks(app, index)
+        register_interval_callbacks(app, index)
+        register_trend_callbacks(app, index)
+    register_focus_callbacks(app)
+    register_comparison_callbacks(app)
+
+    # Started by the first request of every process, under gunicorn in the workers rather than the master
+    server.before_request(dashboard.start_watcher)
+
+    if config['WARM_UP']:
+        dashboard.warm_up()
+    return app
+
+
+app = create_app()
+server = app.server
 
 if __name__ == '__main__':
     app.run_server(debug=True)
@@ -0,0 +1,52 @@
+/* Merges the year dependent parts of a map (its trace data and title) into the figure shown in the browser */
+function mergeMapDelta(figure, delta) {
+    var trace = Object.assign({}, figure.data[0], delta.trace);
+    var layout = Object.assign({}, figure.layout, {title: delta.title});
+    return {data: [trace], layout: layout};
+}
+
+/* Returns the ISO code of the country chosen by the ?country= URL parameter, or the default focus country */
+function focusCountry(search, views) {
+    var code = (new URLSearchParams(search || '').get('country') || '').toUpperCase();
+    return views.countries.indexOf(code) >= 0 ? code : views.focus;
+}
+
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    egov: {
+        /* Switches the year of a map panel from the views of all years stored in the page */
+        switch_year: function (year, search, views, figure) {
+            var view = views && views.years[String(year)];
+            if (!view || !figure) {
+                throw window.dash_clientside.PreventUpdate;
+            }
+            var kpis = view.kpis[focusCountry(search, views)] || ['–', '–', '–'];
+            return [mergeMapDelta(figure, view)].concat(view.outputs, kpis);
+        },
+
+        /* Switches the rank interval of the focus country to the year from the views stored in the page */
+        switch_interval: function (year, search, views) {
+            var view = views && views.years[String(year)];
+            if (!view) {
+                throw window.dash_clientside.PreventUpdate;
+            }
+            return view.intervals[focusCountry(search, views)] || '';
+        },
+
+        /* Switches the complete ranking to the year from the views of all years stored in the page */
+        switch_ranking: function (year, views) {
+            var view = views && views.years[String(year)];
+            if (!view) {
+                throw window.dash_clientside.PreventUpdate;
+            }
+            return view.ranking;
+        },
+
+        /* Applies the map data of a new year sent by the server, keeping the layout already in the browser */
+        apply_map_delta: function (delta, figure) {
+            if (!delta || !figure) {
+                throw window.dash_clientside.PreventUpdate;
+            }
+            return mergeMapDelta(figure, delta);
+        }
+    }
+});
@@ -0,0 +1,221 @@
+"""Benchmarks of the dashboard: startup, figures, tables and the slider callbacks end to end.
+
+Run `python benchmarks.py` to compare the current code with the stored baseline, it fails when
+a benchmark got slower or its payload bigger by more than the threshold. `--save` stores the
+current results as the new baseline.
+"""
+import argparse
+import json
+import os
+import pathlib
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+PATH = pathlib.Path(__file__).parent
+BASELINE_PATH = PATH.joinpath('benchmarks.json')
+
+# Relative slowdown or payload growth against the baseline that counts as a regression
+THRESHOLD = 0.3
+
+# Timings shorter than this are too noisy to compare, they never count as regressions
+MIN_COMPARED_MS = 0.5
+
+
+def measure(function, repeat):
+    """Returns the median duration of the function in milliseconds and its last result."""
+    durations = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        durations.append((time.perf_counter() - start) * 1000)
+    return statistics.median(durations), result
+
+
+def subprocess_ms(code, repeat):
+    """Returns the median wall time of running the code in a fresh interpreter, in milliseconds.
+
+    Every run keeps the rank intervals in a new temporary folder, so each computes them like
+    a first start and none writes into the store of the working tree.
+    """
+    return measure(lambda: subprocess.run([sys.executable, '-c', code], cwd=PATH, check=True,
+                                          stderr=subprocess.DEVNULL,
+                                          env=dict(os.environ, EGOV_RANK_INTERVALS=tempfile.mkdtemp(),
+                                                   EGOV_CALLBACK_CACHE='')), repeat)[0]
+
+
+def first_ms(apps, function):
+    """Returns the median duration of the function's first call on each of the fresh apps, in milliseconds.
+
+    A first call happens once per app, its median over several apps is as stable as that of the other benchmarks.
+    """
+    durations = [measure(lambda: function(app), 1)[0] for app in apps]
+    return statistics.median(durations)
+
+
+def callback_body(outputs, inputs):
+    """Creates the body of a Dash callback request, as the browser sends it."""
+    return {
+        'output': '..' + '...'.join('{}.{}'.format(*output) for output in outputs) + '..',
+        'outputs': [{'id': id, 'property': prop} for id, prop in outputs],
+        'inputs': [{'id': id, 'property': prop, 'value': value} for id, prop, value in inputs],
+        'changedPropIds': ['{}.{}'.format(*inputs[0][:2])],
+    }
+
+
+def panel_outputs(graph_output, prefix):
+    """Returns the outputs of the year callback of the panel, the map first."""
+    return [graph_output] + [(id.format(prefix), 'children') for id in
+                             ('top-{}-title', 'top-{}-table', '{}_rank_value', '{}_score_value', '{}_percentile_value')]
+
+
+def slider_benchmarks(record, mode, app, fresh_apps, repeat):
+    """Records the year callback of every panel of the app, and its first call on each of the fresh apps."""
+    client = app.server.test_client()
+    for index in app.dashboard.indices:
+        prefix = index.key
+        graph_output = (index.delta_store, 'data') if mode != 'full' else (index.graph, 'figure')
+        outputs = panel_outputs(graph_output, prefix)
+        # Cycling through all years, the first round builds the figures, the next ones hit the cache
+        bodies = [callback_body(outputs, [(index.slider, 'value', int(year)), ('url', 'search', '')])
+                  for year in app.dashboard.snapshot.rankings[prefix].years]
+        ms = first_ms(fresh_apps, lambda fresh: fresh.server.test_client().post('/_dash-update-component', json=bodies[0]))
+        record('callback ({}): {} slider, cold'.format(mode, prefix), ms)
+        responses = []
+        durations = []
+        for body in bodies * repeat:
+            duration, response = measure(lambda: client.post('/_dash-update-component', json=body), 1)
+            durations.append(duration)
+            responses.append(response)
+        assert all(response.status_code == 200 for response in responses)
+        record('callback ({}): {} slider'.format(mode, prefix), statistics.median(durations),
+               max(len(response.data) for response in responses))
+
+
+def run(repeat):
+    """Runs all benchmarks and returns their median times in ms and payload sizes in bytes."""
+    from app import create_app
+    from generators import generate_map, generate_table, figure_delta, payload_size
+    from snapshot import load_snapshot
+
+    results = {}
+
+    def record(name, ms, size=None):
+        results[name] = {'ms': round(ms, 3)}
+        if size is not None:
+            results[name]['bytes'] = size
+
+    record('startup: import app', subprocess_ms('import app', repeat))
+    record('startup: import app and warm up', subprocess_ms('import app; app.app.dashboard.warm_up()', repeat))
+
+    from app import DATA_UN, DATA_EU
+    ms, snapshot = measure(lambda: load_snapshot({'un': DATA_UN, 'eu': DATA_EU}), repeat)
+    record('data: load and rank both datasets', ms)
+
+    for name, key in [('world map', 'un'), ('europe map', 'eu')]:
+        df = snapshot.data[key]
+        year = int(df['Year'].max())
+        ms, figure = measure(lambda: generate_map(df, year, key), repeat)
+        record('figure: build {}'.format(name), ms)
+        ms, serialized = measure(figure.to_json, repeat)
+        record('figure: serialize {}'.format(name), ms, len(serialized.encode('utf-8')))
+        ms, delta = measure(lambda: figure_delta(json.loads(serialized)), repeat)
+        record('figure: {} delta'.format(name), ms, payload_size(delta))
+
+    rankings = snapshot.rankings['un']
+    table = rankings.table(rankings.latest())
+    ms, _ = measure(lambda: generate_table(table, 15), repeat)
+    record('table: top 15', ms)
+    ms, _ = measure(lambda: generate_table(table, len(table)), repeat)
+    record('table: all countries', ms)
+    ms, _ = measure(lambda: rankings.page(rankings.latest(), 3, 20, 'Země', True), repeat)
+    record('table: sorted page of complete ranking', ms)
+
+    # Like the tests, the apps keep their callback results and rank intervals in a temporary folder; the
+    # shared callback cache would answer from the results of earlier runs, it is benchmarked on its own
+    store = pathlib.Path(tempfile.mkdtemp())
+    for mode, shared in (('delta', False), ('full', False), ('delta, shared cache', True)):
+        def fresh_app(number):
+            cache = str(store / '{}-{}.sqlite'.format(mode, number)) if shared else ''
+            return create_app({'YEAR_SWITCHING': 'server', 'MAP_UPDATES': mode.split(',')[0], 'CALLBACK_CACHE': cache,
+                               'RANK_INTERVALS': str(store / 'intervals')})
+
+        # The first page load and the cold callbacks after it are measured on apps of their own
+        fresh_apps = [fresh_app(number) for number in range(repeat)]
+        ms = first_ms(fresh_apps, lambda app: app.server.test_client().get('/_dash-layout'))
+        app = fresh_app(repeat)
+        client = app.server.test_client()
+        dashboard = app.dashboard
+        response = client.get('/_dash-layout')
+        record('layout ({}): first page load'.format(mode), ms, len(response.data))
+        ms, response = measure(lambda: client.get('/_dash-layout'), repeat)
+        record('layout ({}): page load'.format(mode), ms, len(response.data))
+        if mode == 'delta':
+            etag = response.headers['ETag']
+            ms, response = measure(lambda: client.get('/_dash-layout', headers={'If-None-Match': etag}), repeat)
+            record('layout: repeat visit (304)', ms, len(response.data))
+            ms, response = measure(lambda: client.get('/_dash-layout', headers={'Accept-Encoding': 'gzip'}), repeat)
+            record('layout: page load (gzip)', ms, len(response.data))
+
+        if mode == 'delta' and dashboard.graph_config:
+            # Geometry the browser downloads for the maps, only when it is served by the app
+            for name in dashboard.geometry:
+                url = dashboard.graph_config['topojsonURL'] + name
+                for encoding in ('identity', 'gzip'):
+                    ms, response = measure(lambda: client.get(url, headers={'Accept-Encoding': encoding}), repeat)
+                    record('geometry: {} ({})'.format(name, encoding), ms, len(response.data))
+
+        slider_benchmarks(record, mode, app, fresh_apps, repeat)
+
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Returns the descriptions of the benchmarks that regressed against the baseline."""
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        before = baseline[name]
+        if before['ms'] >= MIN_COMPARED_MS and result['ms'] > before['ms'] * (1 + threshold):
+            regressions.append('{}: {:.2f} ms -> {:.2f} ms'.format(name, before['ms'], result['ms']))
+        if 'bytes' in before and result.get('bytes', 0) > before['bytes'] * (1 + threshold):
+            regressions.append('{}: {} B -> {} B'.format(name, before['bytes'], result['bytes']))
+    return regressions
+
+
+def report(results, baseline):
+    for name, result in results.items():
+        before = baseline.get(name, {})
+        line = '{:<50} {:>10.2f} ms'.format(name, result['ms'])
+        if 'ms' in before:
+            line += ' (baseline {:.2f} ms)'.format(before['ms'])
+        if 'bytes' in result:
+            line += ' {:>9} B'.format(result['bytes'])
+            if 'bytes' in before:
+                line += ' (baseline {} B)'.format(before['bytes'])
+        print(line)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmarks the dashboard against the stored baseline.')
+    parser.add_argument('--repeat', type=int, default=5, help='number of runs of each benchmark')
+    parser.add_argument('--threshold', type=float, default=THRESHOLD, help='allowed relative regression')
+    parser.add_argument('--save', action='store_true', help='store the results as the new baseline')
+    args = parser.parse_args()
+
+    results = run(args.repeat)
+    baseline = json.loads(BASELINE_PATH.read_text()) if BASELINE_PATH.exists() else {}
+    report(results, baseline)
+
+    if args.save:
+        BASELINE_PATH.write_text(json.dumps(results, indent=2, ensure_ascii=False) + '\n')
+        print('Baseline saved to {}'.format(BASELINE_PATH))
+    else:
+        regressions = compare(results, baseline, args.threshold)
+        for regression in regressions:
+            print('REGRESSION ' + regression)
+        sys.exit(1 if regressions else 0)
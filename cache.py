@@ -0,0 +1,190 @@
+import hashlib
+import json
+import logging
+import os
+import pathlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+
+from plotly.utils import PlotlyJSONEncoder
+
+PATH = pathlib.Path(__file__).parent
+
+# Results used again within this many seconds don't update their last use, to spare the writes
+USE_RESOLUTION = 60
+
+logger = logging.getLogger(__name__)
+
+
+def dataset_version(df, index=True):
+    """Returns a short fingerprint of the dataframe contents, used to tell dataset versions apart in cache keys."""
+    return hashlib.sha1(pd.util.hash_pandas_object(df, index=index).values.tobytes()).hexdigest()[:12]
+
+
+def year_versions(df):
+    """Returns the fingerprint of the rows of every year, which changes only with the rows of that year."""
+    return {int(year): dataset_version(rows, index=False) for year, rows in df.groupby('Year')}
+
+
+def code_version():
+    """Returns a short fingerprint of the app's source files, so results cached by other code aren't reused."""
+    digest = hashlib.sha1()
+    for path in sorted(PATH.glob('*.py')):
+        digest.update(path.read_bytes())
+    return digest.hexdigest()[:12]
+
+
+class FigureCache:
+    """Bounded LRU cache of Plotly figures as plain dicts, serialized and parsed once when built.
+
+    Figures are keyed on the generator, the dataset version, the year and the figure options,
+    a hit returns the stored dict itself, which callers must not modify. The least recently used
+    figures are evicted as soon as the cache holds more than max_entries figures or more than
+    max_bytes of their JSON.
+    """
+
+    def __init__(self, max_entries=64, max_bytes=32 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._size = 0
+        self._figures = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, build):
+        """Returns the figure dict stored under the key, converting the figure returned by build() on a miss."""
+        with self._lock:
+            if key in self._figures:
+                self._figures.move_to_end(key)
+                self.hits += 1
+                return self._figures[key][0]
+            self.misses += 1
+
+        # Building happens outside of the lock so a slow figure doesn't block hits of other years
+        serialized = build().to_json()
+        figure = json.loads(serialized)
+
+        with self._lock:
+            if key not in self._figures:
+                self._figures[key] = figure, len(serialized)
+                self._size += len(serialized)
+                self._evict()
+        return figure
+
+    def figure(self, generate, df, version, year, **options):
+        """Returns the figure made by generate(df, year, **options) as a plain dict, built at most once per key."""
+        key = (generate.__name__, version, year, tuple(sorted(options.items())))
+        return self.get(key, lambda: generate(df, year, **options))
+
+    def stats(self):
+        """Returns the hit and miss counters and the current size of the cache."""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'entries': len(self._figures),
+                'bytes': self._size,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._figures.clear()
+            self._size = 0
+
+    def _evict(self):
+        while self._figures and (len(self._figures) > self.max_entries or self._size > self.max_bytes):
+            _, (_, size) = self._figures.popitem(last=False)
+            self._size -= size
+
+
+class ResultCache:
+    """Callback results shared by all processes of the app, and kept across restarts, in an SQLite file.
+
+    Results are stored as JSON under a hash of their key, which has to contain everything the result
+    depends on, e.g. the callback, its inputs and the dataset version. They expire ttl seconds after
+    being stored, and once the file holds more than max_bytes of results the least recently used are
+    evicted. A failing database never fails a callback, the result is then just computed.
+    """
+
+    def __init__(self, path, ttl=24 * 3600, max_bytes=64 * 1024 * 1024):
+        self.path = pathlib.Path(path)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.namespace = code_version()
+        self.hits = 0
+        self.misses = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def get(self, key, compute):
+        """Returns the result stored under the key, storing the result of compute() on a miss."""
+        digest = hashlib.sha1(json.dumps([self.namespace, key], default=str).encode('utf-8')).hexdigest()
+        now = time.time()
+        try:
+            connection = self._connection()
+            row = connection.execute('SELECT value, stored, used FROM results WHERE key = ?', (digest,)).fetchone()
+            if row is not None and row[1] + self.ttl > now:
+                if row[2] < now - USE_RESOLUTION:
+                    connection.execute('UPDATE results SET used = ? WHERE key = ?', (now, digest))
+                self._count(hit=True)
+                return json.loads(row[0])
+        except sqlite3.Error:
+            logger.exception('Reading the result cache failed')
+            return compute()
+
+        self._count(hit=False)
+        result = compute()
+        value = json.dumps(result, cls=PlotlyJSONEncoder)
+        try:
+            connection.execute('INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)',
+                               (digest, value, len(value), now, now))
+            self._evict(connection, now)
+        except sqlite3.Error:
+            logger.exception('Writing the result cache failed')
+        return result
+
+    def stats(self):
+        """Returns the hit and miss counters of this process."""
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses}
+
+    def clear(self):
+        self._connection().execute('DELETE FROM results')
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def _connection(self):
+        """Returns the connection of the current thread, connections aren't shared by threads or forked processes."""
+        local = self._local
+        if getattr(local, 'pid', None) != os.getpid():
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            connection = sqlite3.connect(str(self.path), timeout=5, isolation_level=None)
+            # Readers don't wait for a writing worker
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, value TEXT NOT NULL, '
+                               'size INTEGER NOT NULL, stored REAL NOT NULL, used REAL NOT NULL)')
+            local.connection, local.pid = connection, os.getpid()
+        return local.connection
+
+    def _evict(self, connection, now):
+        connection.execute('DELETE FROM results WHERE stored <= ?', (now - self.ttl,))
+        size = connection.execute('SELECT COALESCE(SUM(size), 0) FROM results').fetchone()[0]
+        if size <= self.max_bytes:
+            return
+        evicted = []
+        for key, result_size in connection.execute('SELECT key, size FROM results ORDER BY used'):
+            if size <= self.max_bytes:
+                break
+            evicted.append((key,))
+            size -= result_size
+        connection.executemany('DELETE FROM results WHERE key = ?', evicted)
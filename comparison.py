@@ -0,0 +1,57 @@
+import itertools
+
+import numpy as np
+import pandas as pd
+
+from rankings import decimal_scores
+
+
+class Comparison:
+    """Scores of several indices joined on the country code and year, compared pairwise in every year.
+
+    The join and the comparison of every pair of indices in every year they share are computed
+    once, when the data are loaded, so showing a comparison is only a dictionary lookup. Each
+    comparison ranks the countries among those scored by both indices.
+    """
+
+    def __init__(self, indices, names):
+        """Takes the (dataframe, score column) of every index by its key and the names of countries by their code."""
+        self.keys = list(indices)
+        self.joined = pd.concat([df.set_index(['Code', 'Year'])[column].pipe(decimal_scores).rename(key)
+                                 for key, (df, column) in indices.items()], axis=1, join='outer')
+        self.names = names
+        self.views = {}
+        for year, scores in self.joined.groupby(level='Year'):
+            codes = scores.index.get_level_values('Code').to_numpy()
+            for x, y in itertools.permutations(self.keys, 2):
+                view = self._compare(codes, scores[x].to_numpy(), scores[y].to_numpy())
+                if view is not None:
+                    self.views[(int(year), x, y)] = view
+
+    def years(self, x, y):
+        """Returns the years in which both indices score at least two common countries."""
+        return sorted(year for year, view_x, view_y in self.views if (view_x, view_y) == (x, y))
+
+    def view(self, year, x, y):
+        """Returns the comparison of the indices in the year, None if they have no common countries then."""
+        return self.views.get((int(year), x, y))
+
+    def _compare(self, codes, x, y):
+        both = ~(np.isnan(x) | np.isnan(y))
+        if both.sum() < 2:
+            return None
+        codes, x, y = codes[both], x[both], y[both]
+        rank_x = pd.Series(x).rank(method='max', ascending=False).to_numpy()
+        rank_y = pd.Series(y).rank(method='max', ascending=False).to_numpy()
+        # Biggest differences first
+        order = np.argsort(-np.abs(rank_x - rank_y), kind='stable')
+        return {
+            'codes': codes[order].tolist(),
+            'names': [self.names.get(code, code) for code in codes[order]],
+            'x': x[order].tolist(),
+            'y': y[order].tolist(),
+            'rank_x': rank_x[order].astype(int).tolist(),
+            'rank_y': rank_y[order].astype(int).tolist(),
+            'rank_difference': (rank_x - rank_y)[order].astype(int).tolist(),
+            'correlation': float(np.corrcoef(x, y)[0, 1]),
+        }
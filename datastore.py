@@ -0,0 +1,174 @@
+import argparse
+import json
+import pathlib
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from pandas.api.types import is_numeric_dtype
+
+PATH = pathlib.Path(__file__).parent
+DATA_PATH = PATH.joinpath('data').resolve()
+STORE_PATH = PATH.joinpath('store').resolve()
+
+# Narrowest types able to hold the values of the known numeric columns, all other numbers are scores
+COLUMN_TYPES = {'Year': 'int16', 'EU28': 'int8'}
+SCORE_TYPE = 'float32'
+
+
+def read_csv(name, data_path=DATA_PATH):
+    """Reads a dataset from its CSV file in the data folder, the files start with a BOM."""
+    return compact_frame(pd.read_csv(pathlib.Path(data_path) / name, encoding='utf-8-sig'))
+
+
+def compact_frame(df):
+    """Converts the text columns to categories and the numbers to the narrowest fitting types."""
+    return pd.DataFrame({column: compact_column(column, values) for column, values in df.items()})
+
+
+def compact_column(column, values):
+    if not is_numeric_dtype(values):
+        return values.astype('category')
+    # Integer columns with missing values (older generations of the data) stay floats
+    if column in COLUMN_TYPES and values.notna().all():
+        return values.astype(COLUMN_TYPES[column])
+    return values.astype(SCORE_TYPE)
+
+
+def store_root(data_path=DATA_PATH):
+    """Returns the folder with the stores of a data folder, other data folders than the shipped one keep them inside."""
+    data_path = pathlib.Path(data_path).resolve()
+    return STORE_PATH if data_path == DATA_PATH else data_path / '.store'
+
+
+def store_path(name, data_path=DATA_PATH):
+    return store_root(data_path) / pathlib.Path(name).stem
+
+
+def build_store(name, data_path=DATA_PATH):
+    """Converts a CSV dataset into its columnar store: one .npy file per column and a meta.json.
+
+    Numbers are stored in their compact types, text columns as integer codes into a list of
+    categories kept in meta.json. The store is written next to the old one and swapped in at once.
+    """
+    df = read_csv(name, data_path)
+    columns = {}
+    for column, values in df.items():
+        if values.dtype.name == 'category':
+            columns[column] = (values.cat.codes.to_numpy(), values.cat.categories.tolist())
+        else:
+            columns[column] = (values.to_numpy(), None)
+    return write_store(name, columns, len(df), data_path)
+
+
+def append_store(name, rows, data_path=DATA_PATH):
+    """Appends the rows just appended to the CSV dataset to its store, without reading the whole CSV again.
+
+    The store must have been current before the rows were appended to the CSV. Categories stay
+    sorted, as if the store was built from the CSV anew, so the codes of existing rows are remapped.
+    """
+    store = ColumnStore(store_path(name, data_path), data_path)
+    rows = compact_frame(rows)
+    columns = {}
+    for spec in store.meta['columns']:
+        stored = np.load(store.path / spec['file'])
+        added = rows[spec['name']]
+        if spec['categories'] is not None:
+            categories = pd.Index(sorted(set(spec['categories']).union(added.dropna().astype(str))))
+            remap = categories.get_indexer(spec['categories'])
+            # Missing values keep the code -1
+            codes = np.where(added.isna(), -1, categories.get_indexer(added.astype(str)))
+            values = np.concatenate([np.where(stored >= 0, remap[stored], -1), codes])
+            columns[spec['name']] = (values, categories.tolist())
+        else:
+            columns[spec['name']] = (np.concatenate([stored, added.to_numpy(stored.dtype)]), None)
+    return write_store(name, columns, store.meta['rows'] + len(rows), data_path)
+
+
+def write_store(name, columns, rows, data_path=DATA_PATH):
+    """Writes the values and categories of every column into the store of the dataset and swaps it in."""
+    target = store_path(name, data_path)
+    building = target.with_name(target.name + '.building')
+    shutil.rmtree(building, ignore_errors=True)
+    building.mkdir(parents=True)
+
+    specs = []
+    for i, (column, (values, categories)) in enumerate(columns.items()):
+        file = '{}.npy'.format(i)
+        if categories is not None:
+            # The type pandas holds the codes of so many categories in, codes of another type would be copied
+            values = values.astype(pd.Categorical.from_codes([], categories).codes.dtype)
+        np.save(building / file, values)
+        specs.append({'name': column, 'file': file, 'categories': categories})
+
+    source = (pathlib.Path(data_path) / name).stat()
+    meta = {
+        'source': name,
+        'size': source.st_size,
+        'mtime': source.st_mtime_ns,
+        'rows': rows,
+        'columns': specs,
+    }
+    with open(building / 'meta.json', 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False)
+
+    shutil.rmtree(target, ignore_errors=True)
+    building.rename(target)
+    return target
+
+
+class ColumnStore:
+    """Columnar store of one dataset, its columns are memory-mapped only when first used."""
+
+    def __init__(self, path, data_path=DATA_PATH):
+        self.path = pathlib.Path(path)
+        self.data_path = pathlib.Path(data_path)
+        with open(self.path / 'meta.json', encoding='utf-8') as f:
+            self.meta = json.load(f)
+        self.columns = [column['name'] for column in self.meta['columns']]
+        self._values = {}
+
+    def is_current(self):
+        """Tells whether the store was built from the current version of its CSV file."""
+        source = self.data_path / self.meta['source']
+        if not source.exists():
+            return False
+        stat = source.stat()
+        return stat.st_size == self.meta['size'] and stat.st_mtime_ns == self.meta['mtime']
+
+    def column(self, name):
+        if name not in self._values:
+            spec = self.meta['columns'][self.columns.index(name)]
+            values = np.load(self.path / spec['file'], mmap_mode='r')
+            if spec['categories'] is not None:
+                values = pd.Categorical.from_codes(values, spec['categories'])
+            self._values[name] = values
+        return self._values[name]
+
+    def to_frame(self):
+        """Returns the dataset as a dataframe whose columns are the memory-mapped files themselves.
+
+        Every column is its own block: consolidating the columns of one type would copy them to the heap.
+        """
+        return pd.DataFrame({name: pd.Series(self.column(name), copy=False) for name in self.columns}, copy=False)
+
+
+def load_dataset(name, data_path=DATA_PATH):
+    """Returns the dataset from its columnar store if it is built and up to date, otherwise from the CSV."""
+    path = store_path(name, data_path)
+    if (path / 'meta.json').exists():
+        store = ColumnStore(path, data_path)
+        if store.is_current():
+            return store.to_frame()
+    return read_csv(name, data_path)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Builds the columnar stores of the CSV datasets.')
+    parser.add_argument('names', nargs='*', help='CSV files in the data folder, all of them by default')
+    parser.add_argument('--data-dir', type=pathlib.Path, default=DATA_PATH, help='data folder, data/ by default')
+    args = parser.parse_args()
+
+    for name in args.names or sorted(path.name for path in args.data_dir.glob('*.csv')):
+        print('{} -> {}'.format(name, build_store(name, args.data_dir)))
@@ -0,0 +1,153 @@
+import gzip
+import json
+import os
+import pathlib
+
+import numpy as np
+
+from flask import Blueprint, Response, abort, request, send_file, stream_with_context
+from werkzeug.security import safe_join
+
+from datastore import store_root
+
+try:
+    import brotli
+except ImportError:  # Brotli is optional, without it the files are offered gzipped only
+    brotli = None
+
+# Encodings the files are precompressed with, in the order of preference
+ENCODINGS = [('br', '.br'), ('gzip', '.gz')]
+
+# How long browsers and proxies may reuse a downloaded file before revalidating it
+MAX_AGE = 3600
+
+# Number of rows serialized at once by the streaming export
+EXPORT_CHUNK_ROWS = 500
+
+
+def compress(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data)
+    return gzip.compress(data, mtime=0)
+
+
+def compressed_variant(path, encoding, suffix, compressed_path=None):
+    """Returns the file compressed with the encoding, (re)creating it when it wasn't made from the current file.
+
+    The compressed files are kept in compressed_path, by default in the store of the file's data folder,
+    each with the size and modification time of the file it was made from. A file replaced by one with
+    an older modification time (e.g. copied with cp -p) is compressed again too.
+    """
+    compressed_path = compressed_path or store_root(path.parent) / 'downloads'
+    variant = compressed_path / (path.name + suffix)
+    source = variant.with_name(variant.name + '.source.json')
+    stat = path.stat()
+    stamp = {'size': stat.st_size, 'mtime': stat.st_mtime_ns}
+    if not variant.exists() or read_stamp(source) != stamp:
+        compressed_path.mkdir(parents=True, exist_ok=True)
+        # Written aside and renamed, so a concurrent request never sends a half written file;
+        # the stamp goes last, a variant is never taken for one of a file it wasn't made from
+        partial = variant.with_name('{}.{}.tmp'.format(variant.name, os.getpid()))
+        partial.write_bytes(compress(path.read_bytes(), encoding))
+        partial.replace(variant)
+        partial = source.with_name('{}.{}.tmp'.format(source.name, os.getpid()))
+        partial.write_text(json.dumps(stamp), encoding='utf-8')
+        partial.replace(source)
+    return variant
+
+
+def read_stamp(path):
+    """Returns the size and modification time of the file a compressed variant was made from, None if unknown."""
+    try:
+        return json.loads(path.read_text(encoding='utf-8'))
+    except (OSError, ValueError):
+        return None
+
+
+def accepted_encoding():
+    """Returns the preferred encoding accepted by the client and its file suffix, None for no compression."""
+    for encoding, suffix in ENCODINGS:
+        if encoding == 'br' and brotli is None:
+            continue
+        if request.accept_encodings[encoding]:
+            return encoding, suffix
+    return None
+
+
+def downloads_blueprint(dashboard):
+    """Creates the routes downloading whole dataset files and streaming filtered exports of the data."""
+    downloads = Blueprint('downloads', __name__)
+
+    @downloads.route("/data/<path:path>")
+    def download(path):
+        """Downloads the desired file from the data folder, only CSV files directly in it can be downloaded."""
+        data_path = pathlib.Path(dashboard.config['DATA_DIR']).resolve()
+        joined = safe_join(str(data_path), path)
+        if joined is None:
+            abort(404)
+        file = pathlib.Path(joined)
+        if file.parent != data_path or file.suffix != '.csv' or not file.is_file():
+            abort(404)
+        # The name of the file itself, the requested path may take a detour through other folders
+        name = file.name
+
+        encoding = accepted_encoding()
+        if encoding is not None:
+            file = compressed_variant(file, *encoding)
+
+        # Conditional requests (ETag, Last-Modified) and ranges are answered by send_file itself
+        response = send_file(str(file), mimetype='text/csv', conditional=True)
+        response.headers['Content-Disposition'] = 'attachment; filename="{}"'.format(name)
+        response.headers['Vary'] = 'Accept-Encoding'
+        if encoding is not None:
+            response.headers['Content-Encoding'] = encoding[0]
+        response.cache_control.no_cache = None
+        response.cache_control.public = True
+        response.cache_control.max_age = MAX_AGE
+        return response
+
+    @downloads.route("/export/<index>.csv")
+    def export(index):
+        """Streams the rows of one dataset, optionally only of the given ?year= and ?region=eu28."""
+        datasets = dashboard.snapshot.data
+        if index not in datasets:
+            abort(404)
+        df = datasets[index]
+        years, region = export_filters()
+
+        mask = np.ones(len(df), dtype=bool)
+        if years:
+            mask &= df['Year'].isin(years).to_numpy()
+        if region == 'eu28':
+            mask &= df['EU28'].to_numpy() == 1
+
+        response = Response(stream_with_context(export_rows(df, np.flatnonzero(mask))), mimetype='text/csv')
+        response.headers['Content-Disposition'] = 'attachment; filename="{}"'.format(export_name(index, years, region))
+        return response
+
+    return downloads
+
+
+def export_filters():
+    """Returns the years and the region of the export request, aborts with 400 for a malformed one."""
+    years = request.args.getlist('year')
+    # A year that isn't a number would otherwise be dropped and the export would hold all years
+    if not all(year.isdigit() for year in years):
+        abort(400)
+    region = request.args.get('region', 'all')
+    if region not in ('all', 'eu28'):
+        abort(400)
+    return [int(year) for year in years], region
+
+
+def export_rows(df, rows):
+    """Generates the CSV of the selected rows chunk by chunk, never holding a copy of all of them."""
+    # The BOM tells spreadsheet software the file is UTF-8, the same as in the data folder
+    yield '\ufeff' + ','.join(df.columns) + '\n'
+    for start in range(0, len(rows), EXPORT_CHUNK_ROWS):
+        yield df.iloc[rows[start:start + EXPORT_CHUNK_ROWS]].to_csv(header=False, index=False)
+
+
+def export_name(index, years, region):
+    parts = [index] + [str(year) for year in years] + ([region] if region != 'all' else [])
+    return '-'.join(parts) + '.csv'
@@ -1,40 +1,81 @@
+import json
+
 import dash
 import dash_core_components as dcc
 import dash_html_components as html
+import dash_table
+import plotly
 import plotly.graph_objects as go
 import plotly.express as px
 import pandas as pd
 import numpy as np
 
+from dash_table.Format import Format, Scheme, Symbol
+from pandas.api.types import is_float_dtype
+
+from indices import INDICES
+from rankings import PERCENTILE
+
+# Scores are held as float32, maps show them rounded so they don't carry float32 noise digits
+SCORE_DECIMALS = 4
+
+
+def table_columns(dataframe):
+    """Converts the dataframe to plain lists, one per column, with all float columns rounded at once."""
+    return [dataframe[col].astype('float64').round(2).tolist() if is_float_dtype(dataframe[col])
+            else dataframe[col].tolist()
+            for col in dataframe.columns]
+
+
+def table_records(dataframe):
+    """Converts the dataframe to the list of row dictionaries used as DataTable data."""
+    return [dict(zip(dataframe.columns, row)) for row in zip(*table_columns(dataframe))]
+
 
 def generate_table(dataframe, max_rows=10):
+    rows = dataframe.head(max_rows)
     return html.Table([
         html.Thead(
-            html.Tr([html.Th(col) for col in dataframe.columns])
+            html.Tr([html.Th(col) for col in rows.columns])
         ),
         html.Tbody([
-            html.Tr([
-                html.Td(
-                    np.round(dataframe.iloc[i][col], 2)
-                ) if (isinstance(dataframe.iloc[i][col], float)) else (
-                    html.Td(
-                        dataframe.iloc[i][col]
-                    )
-                )
-
-                for col in dataframe.columns
-            ])
-            for i in range(min(len(dataframe), max_rows))
+            html.Tr([html.Td(value) for value in row])
+            for row in zip(*table_columns(rows))
         ])
     ])
 
 
-def generate_world_map(df, year):
+def generate_ranking_table(table_id, columns, page_size=20, native=False):
+    """Creates a table of the complete ranking, whose pages are sorted and sent by the server one at a time.
+
+    A native table gets all rows of the year at once and pages and sorts them in the browser, its
+    percentiles are numbers shown with the percent sign so that they sort by their value.
+    """
+    percentile = {'type': 'numeric', 'format': Format(precision=1, scheme=Scheme.fixed, symbol=Symbol.yes,
+                                                      symbol_suffix='%')}
+    return dash_table.DataTable(
+        id=table_id,
+        columns=[dict({'name': col, 'id': col}, **(percentile if native and col == PERCENTILE else {}))
+                 for col in columns],
+        page_current=0,
+        page_size=page_size,
+        page_action='native' if native else 'custom',
+        sort_action='native' if native else 'custom',
+        sort_mode='single',
+        sort_by=[],
+        style_cell={'textAlign': 'left', 'fontFamily': 'inherit'},
+        style_header={'fontWeight': 'bold'},
+    )
+
+
+def generate_map(df, year, index, resolution=110):
+    """Map of the scores of the registered index with the given key in the given year."""
+    index = INDICES[index]
     filtered_df = df[df.Year == year]
 
     fig = go.Figure(data=go.Choropleth(
         locations=filtered_df['Code'],
-        z=filtered_df['UN eGov index'],
+        z=filtered_df[index.value_column].astype('float64').round(SCORE_DECIMALS),
         text=filtered_df['Czech name'],
 
         colorscale=[[0.0, "rgb(0,150,50)"],
@@ -42,8 +83,8 @@ def generate_world_map(df, year):
                     [0.6, "rgb(180,60,50)"],
                     [1.0, "rgb(80,20,80)"]],
         # Note - this fixes min and max points on colorscale to make years comparable
-        zmin=0,
-        zmax=1,
+        zmin=index.scale[0],
+        zmax=index.scale[1],
         autocolorscale=False,
         reversescale=True,
         marker_line_color='darkgray',
@@ -52,13 +93,22 @@ def generate_world_map(df, year):
         colorbar_title='Hodnota indexu v roce ' + str(year),
     ))
 
-    fig.update_geos(
-        resolution=50
-    )
+    if index.scope == 'world':
+        fig.update_geos(
+            resolution=resolution
+        )
+    else:
+        # Maps of a part of the world are zoomed to the countries of the index
+        fig.update_geos(
+            resolution=resolution,
+            fitbounds="locations",
+            visible=True,
+            scope=index.scope
+        )
 
     fig.update_layout(
         height=1000,
-        title_text=' eGovernment index OSN z roku ' + str(year),
+        title_text=index.map_title + str(year),
         geo=dict(
             showframe=False,
             showcoastlines=False,
@@ -69,10 +119,12 @@ def generate_world_map(df, year):
             y=0.01,
             xref='paper',
             yref='paper',
-            text='Zdroj: <a href="https://publicadministration.un.org/egovkb/">Organizace spojených národů</a>',
+            text='Zdroj: ' + index.source,
             showarrow=False
         )]
     )
+    if index.scope != 'world':
+        fig.update_layout(margin={"r": 0, "t": 0, "l": 0, "b": 0})
 
     # Add logo to figure
     fig.add_layout_image(
@@ -88,66 +140,73 @@ def generate_world_map(df, year):
     return fig
 
 
-def generate_europe_map(df, year):
-    filtered_df = df[df.Year == year]
+def generate_comparison_scatter(comparison, year, x, y, x_title='', y_title=''):
+    """Scatter of the scores of every country in both indices of the comparison, showing their ranks on hover."""
+    view = comparison.view(year, x, y)
+    fig = go.Figure(data=go.Scatter(
+        x=view['x'],
+        y=view['y'],
+        mode='markers',
+        text=view['names'],
+        customdata=list(zip(view['rank_x'], view['rank_y'])),
+        hovertemplate='%{text}<br>' + x_title + ': %{x} (%{customdata[0]}.)<br>'
+                      + y_title + ': %{y} (%{customdata[1]}.)<extra></extra>',
+        marker=dict(color="rgb(0,150,50)", size=9, line=dict(width=0.5, color='darkgray')),
+    ))
+    fig.update_layout(
+        title_text='Srovnání indexů v roce {}, korelace {:.2f}'.format(year, view['correlation']),
+        xaxis_title=x_title,
+        yaxis_title=y_title,
+        height=500,
+        margin={"r": 20, "t": 40, "l": 20, "b": 20},
+    )
+    return fig
 
-    figeu = go.Figure(data=go.Choropleth(
-        locations=filtered_df['Code'],
-        z=filtered_df['EU eGov index'],
-        text=filtered_df['Czech name'],
 
-        colorscale=[[0.0, "rgb(0,150,50)"],
-                    [0.3, "rgb(250,240,110)"],
-                    [0.6, "rgb(180,60,50)"],
-                    [1.0, "rgb(80,20,80)"]],
-        # Note - this fixes min and max points on colorscale to make years comparable
-        zmin=10,
-        zmax=90,
-        autocolorscale=False,
-        reversescale=True,
-        marker_line_color='darkgray',
-        marker_line_width=0.5,
-        colorbar_tickprefix='',
-        colorbar_title='Hodnota indexu v roce ' + str(year),
+def generate_rank_differences(view, x_title, y_title, max_rows=10):
+    """Table of the countries whose rank differs the most between the two indices of the comparison."""
+    rows = min(max_rows, len(view['codes']))
+    return generate_table(pd.DataFrame({
+        'Země': view['names'][:rows],
+        'Pořadí ' + x_title: view['rank_x'][:rows],
+        'Pořadí ' + y_title: view['rank_y'][:rows],
+        'Rozdíl': view['rank_difference'][:rows],
+    }), max_rows)
+
+
+def generate_trend(years, scores, ranks, name, index_title):
+    """Line chart of the score of one country through all years, with its rank on hover."""
+    known = ~np.isnan(scores)
+    fig = go.Figure(data=go.Scatter(
+        x=years[known].tolist(),
+        y=scores[known].round(SCORE_DECIMALS).tolist(),
+        customdata=ranks[known].astype(int).tolist(),
+        mode='lines+markers',
+        hovertemplate='Rok %{x}: %{y} (%{customdata}. místo)<extra></extra>',
+        line=dict(color="rgb(0,150,50)"),
     ))
-
-    figeu.update_geos(
-        resolution=50,
-        fitbounds="locations",
-        visible=True,
-        scope="europe"
+    fig.update_layout(
+        title_text='Vývoj hodnoty {}: {}'.format(index_title, name),
+        xaxis=dict(tickmode='array', tickvals=years.tolist()),
+        height=350,
+        margin={"r": 20, "t": 40, "l": 20, "b": 20},
     )
+    return fig
 
-    figeu.update_layout(
-        height=1000,
-        title_text=' eGovernment index EU z roku ' + str(year),
-        geo=dict(
-            showframe=False,
-            showcoastlines=False,
-            projection_type='equirectangular'
-        ),
-        annotations=[dict(
-            x=0.59,
-            y=0.01,
-            xref='paper',
-            yref='paper',
-            text='Zdroj: <a href="https://ec.europa.eu/newsroom/dae/document.cfm?doc_id=62371">\
-                Evropská unie</a>',
-            showarrow=False
-        )],
-        margin={"r": 0, "t": 0, "l": 0, "b": 0},
-    )
 
-    # Add logo to figure
-    figeu.add_layout_image(
-        dict(
-            source="assets/logo-icon.png",
-            xref="paper", yref="paper",
-            x=1.08, y=1.0,
-            sizex=0.5, sizey=0.1,
-            xanchor="right", yanchor="bottom"
-        )
-    )
-    return figeu
+# Parts of the map trace that differ between years, everything else stays the same
+YEAR_TRACE_KEYS = ('locations', 'z', 'text', 'colorbar')
+
+
+def figure_delta(figure):
+    """Returns only the year dependent parts of a serialized map figure: its trace data and title."""
+    trace = figure['data'][0]
+    return {
+        'trace': {key: trace[key] for key in YEAR_TRACE_KEYS if key in trace},
+        'title': figure['layout']['title'],
+    }
 
 
+def payload_size(value):
+    """Returns the size in bytes of the value serialized to JSON the same way Dash sends it."""
+    return len(json.dumps(value, cls=plotly.utils.PlotlyJSONEncoder).encode('utf-8'))
@@ -0,0 +1,103 @@
+"""Map geometry (topojson) served by the app itself instead of the Plotly CDN.
+
+Plotly.js downloads the outlines of the countries in the browser, by default from cdn.plot.ly.
+`python geometry.py` fetches the files used by the maps into assets/topojson once (the Heroku
+build does this in bin/post_compile); the app then serves them under a URL containing the
+fingerprint of the files, so browsers can cache them for good. Without the files the maps keep
+using the CDN.
+"""
+import argparse
+import hashlib
+import pathlib
+import urllib.request
+
+from flask import Blueprint, abort, send_file
+
+from datastore import STORE_PATH
+from downloads import accepted_encoding, compressed_variant
+
+PATH = pathlib.Path(__file__).parent
+TOPOJSON_PATH = PATH.joinpath('assets', 'topojson')
+CDN_URL = 'https://cdn.plot.ly/'
+
+# Resolutions Plotly has geometry for, of the Natural Earth scales 1:110m and 1:50m
+RESOLUTIONS = (110, 50)
+
+# The files never change under their fingerprinted URL
+MAX_AGE = 365 * 24 * 3600
+
+
+def topojson_name(scope, resolution):
+    """Returns the name of the geometry file Plotly.js loads for the map scope and resolution."""
+    return '{}_{}m.json'.format(scope, resolution)
+
+
+def geometry_version(names):
+    """Returns a short fingerprint of the local geometry files, None if any of them is missing."""
+    digest = hashlib.sha1()
+    for name in sorted(names):
+        path = TOPOJSON_PATH / name
+        if not path.is_file():
+            return None
+        digest.update(name.encode('utf-8'))
+        digest.update(path.read_bytes())
+    return digest.hexdigest()[:12]
+
+
+def graph_config(version):
+    """Returns the dcc.Graph config loading the geometry from the app, the default CDN one without local files."""
+    if version is None:
+        return {}
+    return {'topojsonURL': '/topojson/{}/'.format(version)}
+
+
+def geometry_blueprint(names):
+    """Creates the route serving the geometry files used by the maps, compressed when the browser accepts it."""
+    geometry = Blueprint('geometry', __name__)
+
+    @geometry.route('/topojson/<version>/<name>')
+    def topojson(version, name):
+        # Only the known files, any version: an outdated one is replaced on the next page load anyway
+        if name not in names or not (TOPOJSON_PATH / name).is_file():
+            abort(404)
+        file = TOPOJSON_PATH / name
+        encoding = accepted_encoding()
+        if encoding is not None:
+            file = compressed_variant(file, *encoding, compressed_path=STORE_PATH / 'topojson')
+
+        response = send_file(str(file), mimetype='application/json', conditional=True)
+        response.headers['Vary'] = 'Accept-Encoding'
+        if encoding is not None:
+            response.headers['Content-Encoding'] = encoding[0]
+        response.cache_control.no_cache = None
+        response.cache_control.public = True
+        response.cache_control.max_age = MAX_AGE
+        response.cache_control.immutable = True
+        return response
+
+    return geometry
+
+
+def fetch(names):
+    """Downloads the geometry files from the Plotly CDN into the assets."""
+    TOPOJSON_PATH.mkdir(parents=True, exist_ok=True)
+    for name in names:
+        with urllib.request.urlopen(CDN_URL + name, timeout=60) as response:
+            data = response.read()
+        partial = TOPOJSON_PATH / (name + '.tmp')
+        partial.write_bytes(data)
+        partial.replace(TOPOJSON_PATH / name)
+        print('{}: {} B'.format(name, len(data)))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Downloads the map geometry from the Plotly CDN into the assets.')
+    parser.add_argument('--all', action='store_true', help='all resolutions, not only those used by the maps')
+    args = parser.parse_args()
+
+    if args.all:
+        fetch([topojson_name(scope, resolution) for scope in ('world', 'europe') for resolution in RESOLUTIONS])
+    else:
+        from app import DEFAULT_CONFIG
+        fetch([topojson_name('world', DEFAULT_CONFIG['WORLD_RESOLUTION']),
+               topojson_name('europe', DEFAULT_CONFIG['EUROPE_RESOLUTION'])])
@@ -0,0 +1,13 @@
+import gc
+
+# Import the app in the master process, before the workers are forked
+preload_app = True
+
+
+def when_ready(server):
+    """Loads the data and builds all figures once in the master, the forked workers start with them ready."""
+    from app import app
+    app.dashboard.warm_up()
+    # The garbage collector writes into the header of every object it inspects, which would copy the pages
+    # holding the preloaded data into each worker. Frozen objects are never inspected, so the pages stay shared.
+    gc.freeze()
@@ -0,0 +1,99 @@
+"""Registry of the indices the dashboard shows, one map panel each.
+
+An index is defined by its dataset file, score column and range, colour scale, map scope and labels. Everything
+else, the loading, ranking, figures, tables, callbacks and caches, is one shared pipeline
+keyed by the index, so registering another index (e.g. one of the UN sub-indices) adds its
+panel without any code of its own.
+"""
+from collections import OrderedDict
+
+# Registered indices by their key, in the order of their panels on the page
+INDICES = OrderedDict()
+
+
+class Index:
+    """Definition of one index and of the ids of the components of its panel.
+
+    The ids of most components are made from the key, the map and the year slider keep the
+    ids they had before the panels shared their code.
+    """
+
+    def __init__(self, key, file, value_column, score_range, label, digits, scale, scope, resolution, name, title,
+                 map_title, table_title, source, graph=None, slider=None):
+        self.key = key
+        # Dataset file in the data folder, the column of the scores in it and the range of valid scores
+        self.file = file
+        self.value_column = value_column
+        self.score_range = score_range
+        # Name of the score column in the ranking tables and the number of decimals of a country's score
+        self.label = label
+        self.digits = digits
+        # Fixed range of the colour scale of the map, so that the years are comparable
+        self.scale = scale
+        # Map scope, also the name of its geometry, and the config option with its resolution
+        self.scope = scope
+        self.resolution = resolution
+        # Short name in the comparison, heading of the panel, title of the map and the top table (before the year)
+        self.name = name
+        self.title = title
+        self.map_title = map_title
+        self.table_title = table_title
+        # Source of the data, linked under the map
+        self.source = source
+
+        self.graph = graph or key + '-map'
+        self.slider = slider or key + '-year-slider'
+        self.years_store = key + '-years'
+        self.delta_store = key + '-map-delta'
+        self.trend = key + '-trend'
+        self.ranking_table = 'full-{}-table'.format(key)
+        self.interval = key + '_rank_interval'
+        self.top_title = 'top-{}-title'.format(key)
+        self.top_table = 'top-{}-table'.format(key)
+        # Rank, score and percentile of the focus country, their values and labels
+        self.kpis = [key + kpi for kpi in ('_rank', '_score', '_percentile')]
+
+
+def register(index):
+    """Adds the index to the registry, its panel is shown after those already registered."""
+    INDICES[index.key] = index
+    return index
+
+
+register(Index(
+    key='un',
+    file='eGov-t5.csv',
+    value_column='UN eGov index',
+    score_range=(0.0, 1.0),
+    label='index eGov OSN',
+    digits=3,
+    scale=(0, 1),
+    scope='world',
+    resolution='WORLD_RESOLUTION',
+    name='OSN',
+    title='Index eGovernmentu OSN',
+    map_title=' eGovernment index OSN z roku ',
+    table_title='TOP 15 zemí světa v roce ',
+    source='<a href="https://publicadministration.un.org/egovkb/">Organizace spojených národů</a>',
+    graph='world-map-with-slider',
+    slider='year-slider',
+))
+
+register(Index(
+    key='eu',
+    file='eur-t3.csv',
+    value_column='EU eGov index',
+    score_range=(0.0, 100.0),
+    label='index eGov EU',
+    digits=2,
+    scale=(10, 90),
+    scope='europe',
+    resolution='EUROPE_RESOLUTION',
+    name='EU',
+    title='Index eGovernmentu EU',
+    map_title=' eGovernment index EU z roku ',
+    table_title='TOP 15 zemí EU v roce ',
+    source='<a href="https://ec.europa.eu/newsroom/dae/document.cfm?doc_id=62371">Evropská unie</a>',
+    graph='europe-map-with-slider',
+    slider='year-slider-2',
+))
@@ -0,0 +1,172 @@
+"""Adds the survey of a new year to a dataset, after checking the new file against the dataset.
+
+`python ingest.py eGov-2022.csv --into eGov-t5.csv` checks that the new file has the BOM and
+the columns of the dataset, holds a single year the dataset doesn't have yet, valid and unique
+country codes and scores in the range of each registered index of the dataset. It then appends the rows to the dataset's
+CSV and to its columnar store, without rebuilding the store. A running app picks the new file
+up on its next reload and ranks, draws and caches only the new year, the other years are
+reused from the data it already has.
+"""
+import argparse
+import codecs
+import io
+import pathlib
+import re
+import sys
+
+import pandas as pd
+
+from datastore import DATA_PATH, ColumnStore, append_store, build_store, read_csv, store_path
+from indices import INDICES
+
+# ISO 3166 alpha-3 code, sub-national regions of the synthetic data have a suffix
+CODE_PATTERN = re.compile(r'^[A-Z]{3}(-[A-Z0-9]+)?$')
+NAME_COLUMNS = ('Czech name', 'English name')
+FLAG_COLUMNS = ('EU28',)
+
+
+class ValidationError(ValueError):
+    """The new file doesn't fit the dataset, with all the problems found in it."""
+
+    def __init__(self, errors):
+        super().__init__('\n'.join(errors))
+        self.errors = errors
+
+
+def read_text(path):
+    """Returns the text of the new file without its BOM, raises ValidationError if it isn't encoded like the datasets."""
+    raw = pathlib.Path(path).read_bytes()
+    if not raw.startswith(codecs.BOM_UTF8):
+        raise ValidationError(['The file must start with the UTF-8 BOM, like the datasets do'])
+    try:
+        text = raw[len(codecs.BOM_UTF8):].decode('utf-8')
+    except UnicodeDecodeError as e:
+        raise ValidationError(['The file is not valid UTF-8: {}'.format(e)])
+    if '\ufeff' in text:
+        raise ValidationError(['The file contains another BOM, it is probably made of several files'])
+    return text
+
+
+def invalid_values(new, column, valid, message):
+    """Returns an error for every value of the column that isn't valid, with its line in the file."""
+    # Line numbers of the file, the header is line 1
+    return ['Line {}: {} {!r}'.format(line + 2, message, value)
+            for line, value in new.loc[~new[column].map(valid), column].items()]
+
+
+def check_year(new, dataset):
+    """Returns the errors of the year column, the file must add a single new year."""
+    errors = invalid_values(new, 'Year', lambda value: value.isdigit(), 'invalid year')
+    years = set(new['Year'])
+    if len(years) > 1:
+        errors.append('The file must hold a single year, it holds {}'.format(', '.join(sorted(years))))
+    elif years <= {str(year) for year in dataset['Year'].unique()}:
+        errors.append('The dataset already has the year {}'.format(years.pop()))
+    return errors
+
+
+def check_codes(new, dataset):
+    """Returns the errors and the warnings of the country codes, which must be valid and unique."""
+    errors = invalid_values(new, 'Code', lambda value: CODE_PATTERN.match(value) is not None, 'invalid country code')
+    for line, code in new.loc[new['Code'].duplicated(keep='first'), 'Code'].items():
+        errors.append('Line {}: duplicate country code {!r}'.format(line + 2, code))
+    unknown = sorted(set(new['Code']) - set(dataset['Code'].astype(str)))
+    warnings = ['Countries new to the dataset: {}'.format(', '.join(unknown))] if unknown else []
+    return errors, warnings
+
+
+def check_labels(new):
+    """Returns the errors of the country names, which mustn't be empty, and of the 0/1 flags."""
+    errors = []
+    for column in NAME_COLUMNS:
+        if column in new:
+            errors += invalid_values(new, column, lambda value: value.strip() != '', 'empty ' + column)
+    for column in FLAG_COLUMNS:
+        if column in new:
+            errors += invalid_values(new, column, lambda value: value in ('0', '1'), column + ' must be 0 or 1, not')
+    return errors
+
+
+def check_scores(new, into):
+    """Returns the errors of the scores of every registered index of the dataset, in the range of its definition."""
+    errors = []
+    ranges = {index.value_column: index.score_range for index in INDICES.values() if index.file == into}
+    for column, (low, high) in ranges.items():
+        if column not in new:
+            continue
+        # Countries that weren't scored have an empty score
+        scores = pd.to_numeric(new[column].where(new[column] != ''), errors='coerce')
+        for line, value in new.loc[scores.isna() & (new[column] != ''), column].items():
+            errors.append('Line {}: not a number in {} {!r}'.format(line + 2, column, value))
+        for line, score in scores[(scores < low) | (scores > high)].items():
+            errors.append('Line {}: {} {} out of the range {} to {}'.format(line + 2, column, score, low, high))
+    return errors
+
+
+def validate(path, into, data_path=DATA_PATH):
+    """Checks the new file against the dataset and returns the warnings, raises ValidationError with all errors.
+
+    Countries the dataset doesn't know yet are only warned about, the survey may include new ones.
+    """
+    text = read_text(path)
+    dataset = read_csv(into, data_path)
+    new = pd.read_csv(io.StringIO(text), dtype=str, keep_default_na=False)
+    if list(new.columns) != list(dataset.columns):
+        raise ValidationError(['The columns {} differ from those of {}: {}'.format(
+            list(new.columns), into, list(dataset.columns))])
+    if new.empty:
+        raise ValidationError(['The file has no rows'])
+
+    code_errors, warnings = check_codes(new, dataset)
+    errors = check_year(new, dataset) + code_errors + check_labels(new) + check_scores(new, into)
+    if errors:
+        raise ValidationError(errors)
+    return warnings
+
+
+def ingest(path, into, data_path=DATA_PATH):
+    """Validates the new file and appends its rows to the dataset's CSV and store.
+
+    Returns the number of rows added and the warnings of the validation.
+    """
+    warnings = validate(path, into, data_path)
+
+    target = pathlib.Path(data_path) / into
+    path = pathlib.Path(path)
+    lines = [line for line in path.read_bytes()[len(codecs.BOM_UTF8):].splitlines(keepends=True)[1:] if line.strip()]
+    store = store_path(into, data_path)
+    store_current = (store / 'meta.json').exists() and ColumnStore(store, data_path).is_current()
+
+    # The whole file is swapped in at once, the app never reads it half written
+    content = target.read_bytes()
+    if content and not content.endswith(b'\n'):
+        content += b'\n'
+    partial = target.with_name(target.name + '.ingest')
+    partial.write_bytes(content + b''.join(line if line.endswith(b'\n') else line + b'\n' for line in lines))
+    partial.replace(target)
+
+    if store_current:
+        append_store(into, read_csv(path.name, path.parent), data_path)
+    else:
+        build_store(into, data_path)
+    return len(lines), warnings
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Adds the survey of a new year to a dataset.')
+    parser.add_argument('file', type=pathlib.Path, help='CSV file with the new year, in the format of the dataset')
+    parser.add_argument('--into', required=True, help='CSV file of the dataset in the data folder, e.g. eGov-t5.csv')
+    parser.add_argument('--data-dir', type=pathlib.Path, default=DATA_PATH, help='data folder, data/ by default')
+    parser.add_argument('--check', action='store_true', help='only validate the file, change nothing')
+    args = parser.parse_args()
+
+    try:
+        if args.check:
+            warnings = validate(args.file, args.into, args.data_dir)
+        else:
+            rows, warnings = ingest(args.file, args.into, args.data_dir)
+        for warning in warnings:
+            print('Warning: ' + warning, file=sys.stderr)
+        print('{}: OK'.format(args.file) if args.check else '{}: {} rows added'.format(args.into, rows))
+    except ValidationError as e:
+        sys.exit('{} was not added:\n{}'.format(args.file, e))
@@ -0,0 +1,131 @@
+"""Memory of the app processes, split into the part shared with other processes and the private part.
+
+`python memory.py <gunicorn master pid>` reports the master and all of its workers. Memory the
+workers inherited from the preloaded master stays shared until a worker writes to it, so the
+private memory of a worker is what every additional worker costs. Linux only, it reads /proc.
+
+`python memory.py --datasets` reports the memory held by the data, rankings and trends of every
+index instead, next to what the data would take as a plain pandas dataframe.
+"""
+import argparse
+import os
+import pathlib
+import sys
+
+import numpy as np
+import pandas as pd
+
+PROC_PATH = pathlib.Path('/proc')
+
+# Fields of smaps_rollup reported, in kB there
+FIELDS = {'Rss': 'rss', 'Pss': 'pss', 'Shared_Clean': 'shared', 'Shared_Dirty': 'shared',
+          'Private_Clean': 'private', 'Private_Dirty': 'private'}
+
+
+def memory_report(pid='self'):
+    """Returns the resident, proportional, shared and private memory of the process in bytes, None without /proc."""
+    path = PROC_PATH / str(pid) / 'smaps_rollup'
+    if not path.exists():
+        return None
+    report = {'rss': 0, 'pss': 0, 'shared': 0, 'private': 0}
+    for line in path.read_text().splitlines():
+        field, _, value = line.partition(':')
+        if field in FIELDS:
+            report[FIELDS[field]] += int(value.split()[0]) * 1024
+    return report
+
+
+def child_pids(pid):
+    """Returns the processes whose parent is the given one."""
+    children = []
+    for stat in PROC_PATH.glob('[0-9]*/stat'):
+        try:
+            # The name in parentheses may contain spaces, the parent pid is the second field after it
+            fields = stat.read_text().rpartition(')')[2].split()
+        except OSError:
+            continue
+        if int(fields[1]) == pid:
+            children.append(int(stat.parent.name))
+    return sorted(children)
+
+
+def deep_size(obj, seen=None):
+    """Returns the bytes held by the object and everything it refers to, counting every object once.
+
+    Dataframes and arrays count their values, other objects their own size and that of their
+    attributes and items. Objects already in seen aren't counted again.
+    """
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    if isinstance(obj, pd.DataFrame):
+        return int(obj.memory_usage(index=True, deep=True).sum())
+    if isinstance(obj, (pd.Series, pd.Index)):
+        return int(obj.memory_usage(deep=True))
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_size(key, seen) + deep_size(value, seen) for key, value in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_size(item, seen) for item in obj)
+    elif hasattr(obj, '__dict__'):
+        size += deep_size(vars(obj), seen)
+    return size
+
+
+def dataset_report(snapshot):
+    """Returns the bytes held by the data, rankings and trends of every index of the snapshot by its key.
+
+    Parts shared by several indices, like the dataframe of indices in one file, are counted with
+    the first of them; the comparison of the indices is reported under its own key.
+    """
+    seen = set()
+    report = {}
+    for key, df in snapshot.data.items():
+        report[key] = {'rows': len(df),
+                       'years': len(snapshot.rankings[key].years),
+                       'data': deep_size(df, seen),
+                       'rankings': deep_size(snapshot.rankings[key], seen),
+                       'trends': deep_size(snapshot.trends[key], seen)}
+    report['comparison'] = {'data': deep_size(snapshot.comparison, seen)}
+    return report
+
+
+def print_dataset_report(config):
+    """Prints the memory of the datasets of the configured indices, with that of plain pandas dataframes."""
+    from app import Dashboard
+    dashboard = Dashboard(config)
+    report = dataset_report(dashboard.snapshot)
+    datasets = dashboard.datasets()
+    print('{:>10} {:>8} {:>6} {:>9} {:>9} {:>11} {:>9}'.format(
+        'index', 'rows', 'years', 'plain MB', 'data MB', 'rankings MB', 'trends MB'))
+    for key, parts in report.items():
+        if key == 'comparison':
+            print('{:>10} {:>8} {:>6} {:>9} {:>9.2f}'.format(key, '', '', '', parts['data'] / 2 ** 20))
+            continue
+        plain = pd.read_csv(pathlib.Path(config['DATA_DIR']) / datasets[key], encoding='utf-8-sig')
+        print('{:>10} {:>8} {:>6} {:>9.2f} {:>9.2f} {:>11.2f} {:>9.2f}'.format(
+            key, parts['rows'], parts['years'], deep_size(plain) / 2 ** 20,
+            *(parts[part] / 2 ** 20 for part in ('data', 'rankings', 'trends'))))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Reports the shared and private memory of a process and its children.')
+    parser.add_argument('pid', type=int, nargs='?', default=os.getpid(), help='pid of the gunicorn master')
+    parser.add_argument('--datasets', action='store_true',
+                        help='report the memory of the datasets of the indices instead, of EGOV_DATA_DIR')
+    args = parser.parse_args()
+
+    if args.datasets:
+        from app import DEFAULT_CONFIG
+        print_dataset_report(dict(DEFAULT_CONFIG))
+        sys.exit()
+
+    print('{:>8} {:>10} {:>10} {:>10} {:>10}'.format('pid', 'RSS MB', 'PSS MB', 'shared MB', 'private MB'))
+    for role, pid in [('master', args.pid)] + [('worker', pid) for pid in child_pids(args.pid)]:
+        report = memory_report(pid)
+        if report is not None:
+            print('{:>8} {:>10.1f} {:>10.1f} {:>10.1f} {:>10.1f}  {}'.format(
+                pid, *(report[key] / 2 ** 20 for key in ('rss', 'pss', 'shared', 'private')), role))
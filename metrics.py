@@ -0,0 +1,158 @@
+"""Request and callback metrics of the app, exposed in the Prometheus text format on /metrics.
+
+Recording a request costs a timer and a few counter increments under a lock, the text is
+only put together when somebody scrapes it. Every process keeps its own metrics, so under
+gunicorn each scrape reports the worker that happened to answer it.
+"""
+import bisect
+import os
+import threading
+import time
+
+from flask import Blueprint, Response, g, request
+
+from memory import memory_report
+
+# Upper bounds of the histogram buckets, latencies in seconds and response sizes in bytes
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+CALLBACK_ENDPOINT = '/_dash-update-component'
+
+
+class Histogram:
+    """Counts of observed values in cumulative buckets, together with their sum."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def samples(self):
+        """Returns the cumulative count of every bucket bound, the last one being +Inf."""
+        total = 0
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            total += count
+            yield bound, total
+
+
+class Metrics:
+    """Latency and size histograms of requests by route and of callbacks by their outputs."""
+
+    def __init__(self):
+        self._histograms = {}
+        self._responses = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name, labels, value, buckets):
+        key = (name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def count_response(self, route, status):
+        key = (route, status)
+        with self._lock:
+            self._responses[key] = self._responses.get(key, 0) + 1
+
+    def record(self, route, callback, seconds, size, status):
+        """Records one finished request, the callback is None for requests other than Dash callbacks."""
+        self.count_response(route, status)
+        self.observe('egov_request_duration_seconds', (('route', route),), seconds, LATENCY_BUCKETS)
+        if size is not None:
+            self.observe('egov_response_size_bytes', (('route', route),), size, SIZE_BUCKETS)
+        if callback is not None:
+            self.observe('egov_callback_duration_seconds', (('callback', callback),), seconds, LATENCY_BUCKETS)
+            if size is not None:
+                self.observe('egov_callback_response_size_bytes', (('callback', callback),), size, SIZE_BUCKETS)
+
+    def render(self, dashboard):
+        """Returns all metrics and the counters of the dashboard's caches in the Prometheus text format."""
+        with self._lock:
+            histograms = sorted((key, list(histogram.samples()), histogram.sum)
+                                for key, histogram in self._histograms.items())
+            responses = sorted(self._responses.items())
+
+        lines = ['# TYPE egov_responses_total counter']
+        lines += ['egov_responses_total{}'.format(sample_labels((('route', route), ('status', str(status)))))
+                  + ' {}'.format(count) for (route, status), count in responses]
+
+        typed = set()
+        for (name, labels), samples, total in histograms:
+            if name not in typed:
+                lines.append('# TYPE {} histogram'.format(name))
+                typed.add(name)
+            for bound, count in samples:
+                lines.append('{}_bucket{} {}'.format(name, sample_labels(labels + (('le', str(bound)),)), count))
+            lines.append('{}_sum{} {}'.format(name, sample_labels(labels), total))
+            lines.append('{}_count{} {}'.format(name, sample_labels(labels), samples[-1][1]))
+
+        report = memory_report()
+        if report is not None:
+            # Memory of the process that answered the scrape, under gunicorn one of the workers
+            lines.append('# TYPE egov_memory_bytes gauge')
+            lines += ['egov_memory_bytes{} {}'.format(sample_labels((('pid', str(os.getpid())), ('kind', kind))), value)
+                      for kind, value in report.items()]
+
+        datasets = dashboard.dataset_memory()
+        if datasets is not None:
+            # Memory held by the data of every index, shared with the master under gunicorn
+            lines.append('# TYPE egov_dataset_bytes gauge')
+            lines += ['egov_dataset_bytes{} {}'.format(sample_labels((('index', key), ('part', part))), value)
+                      for key, parts in datasets.items() for part, value in parts.items()
+                      if part not in ('rows', 'years')]
+
+        caches = [('figure', dashboard.figure_cache)]
+        if dashboard.callback_cache is not None:
+            caches.append(('callback', dashboard.callback_cache))
+        for cache, stats in ((cache, instance.stats()) for cache, instance in caches):
+            for key, value in stats.items():
+                kind = 'counter' if key in ('hits', 'misses') else 'gauge'
+                name = 'egov_{}_cache_{}{}'.format(cache, key, '_total' if kind == 'counter' else '')
+                lines += ['# TYPE {} {}'.format(name, kind), '{} {}'.format(name, value)]
+        return '\n'.join(lines) + '\n'
+
+
+def sample_labels(labels):
+    escaped = ('{}="{}"'.format(name, value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+               for name, value in labels)
+    return '{' + ','.join(escaped) + '}' if labels else ''
+
+
+def instrument(server, dashboard, metrics):
+    """Times every request of the server and serves the collected metrics on /metrics."""
+
+    @server.before_request
+    def start_timer():
+        g.metrics_start = time.perf_counter()
+
+    @server.after_request
+    def record_request(response):
+        start = g.pop('metrics_start', None)
+        if start is None:
+            return response
+        # Routes are labelled with their rule, not the URL, so e.g. every file download counts as one route
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        callback = None
+        if route == CALLBACK_ENDPOINT:
+            # Dash has already parsed the body, the callback is identified by its outputs
+            body = request.get_json(silent=True) or {}
+            callback = str(body.get('output', 'unknown'))
+        # Streamed responses have no known length, only the time until they start is measured for them
+        size = response.content_length
+        metrics.record(route, callback, time.perf_counter() - start, size, response.status_code)
+        return response
+
+    exposition = Blueprint('metrics', __name__)
+
+    @exposition.route('/metrics')
+    def scrape():
+        return Response(metrics.render(dashboard), mimetype='text/plain; version=0.0.4')
+
+    server.register_blueprint(exposition)
@@ -0,0 +1,144 @@
+"""Pre-renders the panels of every year of all indices into a bundle of files the app reads instead of computing.
+
+`python prerender.py --out bundle` writes, for every year of every index (UN and EU), the map figure,
+the title, the top 15 table and the values of every country,
+one JSON file per panel and year, computed in parallel processes. `EGOV_BUNDLE=bundle` makes the
+app answer its year callbacks from them. The page and its callbacks are still served by the app,
+the bundle only saves computing the panels; nothing renders a page from it without the app.
+"""
+import argparse
+import json
+import multiprocessing
+import pathlib
+import shutil
+
+from plotly.utils import PlotlyJSONEncoder
+
+_dashboard = None
+
+
+def panel_view(dashboard, panel, year):
+    """Returns everything the panel of the index shows in the given year, with the values of every ranked country."""
+    rankings = dashboard.snapshot.rankings[panel]
+    figure, title, table = dashboard.panel_outputs(panel, year)[:3]
+    return {
+        'figure': figure,
+        'title': title,
+        'table': table,
+        'kpis': {code: dashboard.focus_kpis(rankings, year, code) for code in rankings.codes[year].tolist()},
+    }
+
+
+def init_worker(config):
+    """Creates the dashboard of a worker process, each process loads the data once."""
+    global _dashboard
+    from app import Dashboard
+    _dashboard = Dashboard(config)
+
+
+def render(task):
+    """Writes the view of one panel and year into the bundle, run in a worker process."""
+    out, panel, year = task
+    view = panel_view(_dashboard, panel, year)
+    path = pathlib.Path(out) / panel
+    path.joinpath('{}.json'.format(year)).write_text(json.dumps(view, cls=PlotlyJSONEncoder), encoding='utf-8')
+    return panel, year
+
+
+def prerender(out, config, processes=None, progress=None):
+    """Pre-renders all years of the panels of all shown indices into the out folder, returns the bundle's manifest.
+
+    The bundle is written next to the old one and swapped in at once, apps keep serving the old one meanwhile.
+    progress(panel, year) is called after each panel and year is written, in the order they finish.
+    """
+    from app import Dashboard
+    # The panels are always computed, not read from an earlier bundle
+    config = dict(config, BUNDLE='')
+    dashboard = Dashboard(config)
+    snapshot = dashboard.snapshot
+    target = pathlib.Path(out)
+    out = target.with_name(target.name + '.building')
+    shutil.rmtree(out, ignore_errors=True)
+    tasks = []
+    manifest = {'focus': config['FOCUS_COUNTRY'], 'versions': {}, 'options': {}, 'years': {}}
+    for panel, rankings in snapshot.rankings.items():
+        years = [int(year) for year in rankings.years]
+        manifest['versions'][panel] = snapshot.versions[panel]
+        # The maps are drawn with these options, an app configured otherwise doesn't use them
+        manifest['options'][panel] = dashboard.figure_options(panel)
+        manifest['years'][panel] = years
+        out.joinpath(panel).mkdir(parents=True, exist_ok=True)
+        tasks += [(str(out), panel, year) for year in years]
+
+    with multiprocessing.Pool(processes, initializer=init_worker, initargs=(config,)) as pool:
+        for panel, year in pool.imap_unordered(render, tasks):
+            if progress is not None:
+                progress(panel, year)
+
+    out.mkdir(parents=True, exist_ok=True)
+    out.joinpath('manifest.json').write_text(json.dumps(manifest, indent=2), encoding='utf-8')
+    shutil.rmtree(target, ignore_errors=True)
+    out.rename(target)
+    return manifest
+
+
+class Bundle:
+    """Pre-rendered panels read from a bundle folder, each file is read once.
+
+    A folder without a readable manifest is no bundle, the panels are then computed. A bundle
+    swapped in by prerender() has a new manifest, the panels are then read from the new bundle.
+    """
+
+    def __init__(self, path):
+        self.path = pathlib.Path(path)
+        self._manifest = (None, None)
+        self._views = {}
+
+    def manifest(self):
+        """Returns the manifest of the current bundle in the folder, None if there is none."""
+        try:
+            stat = self.path.joinpath('manifest.json').stat()
+        except OSError:
+            return None
+        stamp = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if self._manifest[0] != stamp:
+            try:
+                manifest = json.loads(self.path.joinpath('manifest.json').read_text(encoding='utf-8'))
+            except (OSError, ValueError):
+                return None
+            self._views = {}
+            self._manifest = (stamp, manifest)
+        return self._manifest[1]
+
+    def view(self, panel, version, year, options):
+        """Returns the pre-rendered panel of the year, None if the bundle was made from another dataset version
+        or with other figure options."""
+        manifest = self.manifest()
+        if manifest is None or manifest['versions'].get(panel) != version or \
+                manifest.get('options', {}).get(panel) != options or int(year) not in manifest['years'][panel]:
+            return None
+        views = self._views
+        key = (panel, int(year))
+        if key not in views:
+            try:
+                views[key] = json.loads((self.path / panel / '{}.json'.format(int(year))).read_text(encoding='utf-8'))
+            except (OSError, ValueError):
+                # The bundle is being swapped for another one
+                return None
+        return views[key]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Pre-renders the panels of all years into a bundle the app serves from.')
+    parser.add_argument('--out', type=pathlib.Path, default=pathlib.Path('bundle'), help='bundle folder')
+    parser.add_argument('--processes', type=int, default=None, help='number of processes, all CPUs by default')
+    parser.add_argument('--serve', action='store_true', help='serve the app from an already written bundle')
+    args = parser.parse_args()
+
+    from app import DEFAULT_CONFIG, create_app
+    if args.serve:
+        create_app({'BUNDLE': str(args.out)}).run_server()
+    else:
+        prerender(args.out, dict(DEFAULT_CONFIG), args.processes,
+                  progress=lambda panel, year: print('{} {}'.format(panel, year)))
+        print('Bundle written to {}'.format(args.out))
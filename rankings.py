@@ -0,0 +1,170 @@
+import math
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+# Column names of the ranking tables shown in the dashboard
+RANK = 'Pořadí'
+COUNTRY = 'Země'
+PERCENTILE = 'Percentil'
+
+# Letters of the Czech alphabet in their order, ch is one letter between h and i
+CZECH_ALPHABET = ['a', 'b', 'c', 'č', 'd', 'e', 'f', 'g', 'h', 'ch', 'i', 'j', 'k', 'l', 'm', 'n', 'o', 'p', 'q', 'r',
+                  'ř', 's', 'š', 't', 'u', 'v', 'w', 'x', 'y', 'z', 'ž']
+CZECH_LETTERS = {letter: chr(0x100 + weight) for weight, letter in enumerate(CZECH_ALPHABET)}
+
+
+def decimal_scores(values):
+    """Converts float32 scores to the float64 of the decimal numbers they were read from.
+
+    Rounding the float64 of a float32 directly can round the other way than the number
+    in the source data, e.g. 0.7155 is held as 0.71549999... and would be shown as 0.715.
+    """
+    if values.dtype == np.float32:
+        return values.astype(str).astype('float64')
+    return values
+
+
+def czech_key(text):
+    """Returns a string whose code point order is the Czech alphabetical order of the text.
+
+    Č, ř, š and ž are letters of their own and ch follows h, other accents only decide between
+    otherwise equal names, e.g. Česko sorts before Dánsko and Chile after Hongkong.
+    """
+    lower = text.lower()
+    weights = []
+    position = 0
+    while position < len(lower):
+        letter = lower[position:position + 2] if lower.startswith('ch', position) else lower[position]
+        position += len(letter)
+        if letter not in CZECH_LETTERS:
+            # Á is sorted as a, ü as u; characters other than letters keep their place before the letters
+            letter = unicodedata.normalize('NFD', letter)[0]
+        weights.append(CZECH_LETTERS.get(letter, letter))
+    return ''.join(weights) + '\0' + text
+
+
+def format_percentile(percentile):
+    """Returns the percentile as shown in the tables, e.g. 72.5%, an empty string for a country without a score."""
+    return '' if np.isnan(percentile) else '{}%'.format(float(percentile))
+
+
+class Rankings:
+    """Rank, percentile and sorted order of every year of one dataset.
+
+    Everything is computed once, in a single grouped pass over the whole
+    dataset, so that the slider callbacks only do a dictionary lookup.
+    Given the fingerprints of the years and the rankings of a previous
+    version of the dataset, only the years that changed are ranked again.
+
+    The values of the countries and their codes are numpy arrays, looking a country up doesn't
+    touch the reference counts of Python objects, so the pages holding them stay shared by the
+    gunicorn workers forked from the master that computed them.
+    """
+
+    def __init__(self, df, value_column, label, digits=2, versions=None, previous=None):
+        self.value_column = value_column
+        self.label = label
+        # Number of decimals the score of a single country is shown with
+        self.digits = digits
+        self.columns = [RANK, COUNTRY, label, PERCENTILE]
+        # Czech names of all countries of the dataset by their ISO code
+        self.names = dict(zip(df['Code'], df['Czech name']))
+        self.versions = versions or {}
+
+        reused = [year for year, version in self.versions.items()
+                  if previous is not None and year in previous.tables and previous.versions.get(year) == version]
+        if reused:
+            df = df[~df['Year'].isin(reused)]
+
+        by_year = df.groupby('Year')[value_column]
+        percentile = (by_year.rank(pct=True) * 100).round(1)
+        ranked = pd.DataFrame({
+            'Year': df['Year'],
+            'Code': df['Code'],
+            RANK: by_year.rank(method='max', ascending=False),
+            COUNTRY: df['Czech name'],
+            label: decimal_scores(df[value_column]),
+            PERCENTILE: (percentile.astype(str) + '%').where(percentile.notna(), ''),
+            'percentile': percentile,
+        })
+        # Stable sort keeps the file order of countries with equal scores
+        ranked = ranked.sort_values(['Year', label], ascending=[True, False], kind='mergesort')
+
+        self.tables = {}
+        self.codes = {}
+        self.lookups = {}
+        self.values = {}
+        self.orders = {}
+        for year in reused:
+            self.tables[year] = previous.tables[year]
+            self.codes[year] = previous.codes[year]
+            self.lookups[year] = previous.lookups[year]
+            self.values[year] = previous.values[year]
+            self.orders[year] = previous.orders[year]
+        for year, table in ranked.groupby('Year'):
+            self.tables[year] = table[self.columns]
+            # ISO code of the country in every row of the year's table, and the rows in the order of their codes
+            self.codes[year] = table['Code'].to_numpy(str)
+            self.lookups[year] = np.argsort(self.codes[year], kind='stable')
+            # Rank, score and percentile (a number) of every row
+            self.values[year] = (table[RANK].to_numpy('float64'), table[label].to_numpy('float64'),
+                                 table['percentile'].to_numpy('float64'))
+            self.orders[year] = self._sort_orders(self.tables[year])
+        self.years = sorted(self.tables)
+
+    def table(self, year):
+        """Returns the ranking table of the given year, sorted from the best score."""
+        return self.tables[year]
+
+    def position(self, year, code):
+        """Returns the row of the country with the ISO code in the year's table, None if it isn't ranked that year."""
+        codes, lookup = self.codes[year], self.lookups[year]
+        index = np.searchsorted(codes, code, sorter=lookup)
+        if index == len(codes) or codes[lookup[index]] != code:
+            return None
+        return int(lookup[index])
+
+    def country(self, year, code):
+        """Returns the rank, score and percentile of the country with the ISO code, None if it isn't ranked that year."""
+        position = self.position(year, code)
+        if position is None:
+            return None
+        ranks, scores, percentiles = self.values[year]
+        return float(ranks[position]), float(scores[position]), format_percentile(percentiles[position])
+
+    def latest(self):
+        """Returns the most recent year of the dataset."""
+        return self.years[-1]
+
+    def page(self, year, page, page_size, sort_column=None, descending=False):
+        """Returns one page of the year's ranking, taken from the precomputed order of the sort column.
+
+        The ranking is in its own order, by the rank, when the column is None or not one of the table.
+        """
+        table = self.tables[year]
+        start = page * page_size
+        if sort_column not in self.orders[year]:
+            return table.iloc[start:start + page_size]
+        ascending_order, descending_order = self.orders[year][sort_column]
+        order = descending_order if descending else ascending_order
+        return table.iloc[order[start:start + page_size]]
+
+    def page_count(self, year, page_size):
+        """Returns the number of pages of the year's ranking."""
+        return max(1, math.ceil(len(self.tables[year]) / page_size))
+
+    def _sort_orders(self, table):
+        """Returns the ascending and descending row order of every column, countries without a score last."""
+        orders = {}
+        for column in table.columns:
+            # Percentiles are formatted strings, they are ordered by the score they were computed from
+            keys = table[self.label if column == PERCENTILE else column].to_numpy()
+            if column == COUNTRY:
+                keys = np.array([czech_key(name) for name in keys])
+            # Row numbers in the smallest integer type that holds them, the tables have a few hundred rows
+            ascending = np.argsort(keys, kind='stable').astype(np.min_scalar_type(len(keys)))
+            missing = pd.isna(keys[ascending])
+            orders[column] = (ascending, np.concatenate([ascending[~missing][::-1], ascending[missing]]))
+        return orders
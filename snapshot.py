@@ -0,0 +1,70 @@
+import pathlib
+
+from cache import dataset_version, year_versions
+from comparison import Comparison
+from datastore import DATA_PATH, load_dataset
+from indices import INDICES
+from rankings import Rankings
+from trends import Trends
+
+
+class Snapshot:
+    """One version of the datasets of all indices together with everything precomputed from them.
+
+    A snapshot is never changed after it is built, callbacks can read it without locking.
+    A reload builds a complete new snapshot and only then swaps it in; given the
+    previous snapshot, the rankings of the years whose rows didn't change are reused.
+    Everything is held in dictionaries by the key of the index.
+    """
+
+    def __init__(self, frames, sources=None, previous=None):
+        self.data = frames
+        self.rankings = {}
+        self.trends = {}
+        self.versions = {}
+        # Fingerprints of the rows of every year, the figures and callbacks of a year are cached under them
+        self.year_versions = {}
+        for key, df in frames.items():
+            index = INDICES[key]
+            self.year_versions[key] = year_versions(df)
+            self.rankings[key] = Rankings(df, index.value_column, index.label, index.digits,
+                                          versions=self.year_versions[key],
+                                          previous=previous.rankings.get(key) if previous is not None else None)
+            self.trends[key] = Trends(df, index.value_column)
+            self.versions[key] = dataset_version(df)
+        # Names of all countries, those of the first index win
+        self.country_names = {}
+        for rankings in reversed(list(self.rankings.values())):
+            self.country_names.update(rankings.names)
+        # Scores of all indices joined on the country and year, for comparing them
+        self.comparison = Comparison({key: (df, INDICES[key].value_column) for key, df in frames.items()},
+                                     self.country_names)
+        # Size and modification time of the files the snapshot was loaded from
+        self.sources = sources
+
+
+def source_stamps(names, data_path=DATA_PATH):
+    """Returns the size and modification time of every file, None for a missing one; they change with the file."""
+    stamps = []
+    for name in names:
+        path = pathlib.Path(data_path) / name
+        stat = path.stat() if path.exists() else None
+        stamps.append((name, stat.st_size, stat.st_mtime_ns) if stat is not None else None)
+    return tuple(stamps)
+
+
+def load_snapshot(datasets, data_path=DATA_PATH, previous=None):
+    """Loads the datasets of the indices by their key and precomputes their rankings.
+
+    Indices with their scores in the same file share one dataframe. The rankings of the
+    unchanged years are reused from the previous snapshot.
+    """
+    names = dataset_files(datasets)
+    sources = source_stamps(names, data_path)
+    frames = {name: load_dataset(name, data_path) for name in names}
+    return Snapshot({key: frames[name] for key, name in datasets.items()}, sources, previous)
+
+
+def dataset_files(datasets):
+    """Returns the files of the datasets of the indices, each once."""
+    return list(dict.fromkeys(datasets.values()))
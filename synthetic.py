@@ -0,0 +1,105 @@
+"""Generates synthetic datasets in the format of the shipped ones, only much bigger.
+
+The real data has a couple of thousand rows, too few to notice how the callbacks and tables
+scale. `python synthetic.py --out /tmp/egov-big --years 100 --regions 9` writes the file of
+every registered index, eGov-t5.csv and eur-t3.csv by default, with the same columns into the
+folder, EGOV_DATA_DIR=/tmp/egov-big then points the dashboard at them.
+"""
+import argparse
+import pathlib
+
+import numpy as np
+import pandas as pd
+
+from datastore import DATA_PATH
+from indices import INDICES
+from snapshot import dataset_files
+
+# Largest change of a score from one year to the next, as a fraction of the range of the index
+STEP = 0.05
+
+
+def entities(source, index, regions):
+    """Returns the countries of the source dataset followed by their made up sub-national regions."""
+    countries = source.drop_duplicates('Code', keep='first').drop(columns=['Year', index])
+    frames = [countries]
+    for region in range(1, regions + 1):
+        frame = countries.copy()
+        suffix = '-R{:02d}'.format(region)
+        for column in ('Czech name', 'English name'):
+            frame[column] = frame[column] + ' {}'.format(region)
+        frame['Code'] = frame['Code'] + suffix
+        if 'EU-code' in frame:
+            frame['EU-code'] = frame['EU-code'] + suffix
+        frames.append(frame)
+    return pd.concat(frames, ignore_index=True)
+
+
+def scores(rng, count, years, low, high, step):
+    """Returns a random walk of scores of every entity through the years, as an array years x entities."""
+    walk = np.empty((years, count))
+    walk[0] = rng.uniform(low + (high - low) * 0.2, high, count)
+    for year in range(1, years):
+        walk[year] = np.clip(walk[year - 1] + rng.uniform(-step, step, count), low, high)
+    return walk
+
+
+def file_index(name):
+    """Returns the index the file was registered for first, the one whose column the others are made up around."""
+    return next(index for index in INDICES.values() if index.file == name)
+
+
+def generate(source, name, years, regions=0, sub_indices=0, seed=0):
+    """Generates a dataset with the columns of the source one for the given number of years up to its latest year.
+
+    Every country gets the given number of sub-national regions as extra rows, and optionally
+    sub-index columns the index is the mean of, the way the UN index is composed.
+    """
+    rng = np.random.default_rng(seed)
+    registered = file_index(name)
+    index = registered.value_column
+    low, high = registered.score_range
+    step = (high - low) * STEP
+    base = entities(source, index, regions)
+    last_year = int(source['Year'].max())
+    year_values = list(range(last_year - years + 1, last_year + 1))
+
+    parts = [scores(rng, len(base), years, low, high, step) for _ in range(max(sub_indices, 1))]
+    values = np.mean(parts, axis=0) if sub_indices else parts[0]
+
+    frames = []
+    # Newest year first, like in the shipped files
+    for position in reversed(range(years)):
+        frame = base.copy()
+        frame[index] = values[position].round(4)
+        for number, part in enumerate(parts[:sub_indices], 1):
+            frame['{} {}'.format(index, number)] = part[position].round(4)
+        frame['Year'] = year_values[position]
+        frames.append(frame)
+    columns = list(source.columns) + ['{} {}'.format(index, number) for number in range(1, sub_indices + 1)]
+    return pd.concat(frames, ignore_index=True)[columns]
+
+
+def read_source(name):
+    return pd.read_csv(DATA_PATH / name, encoding='utf-8-sig')
+
+
+def write(df, path):
+    # With a BOM like the shipped files, the app and spreadsheets read it as UTF-8
+    df.to_csv(path, index=False, encoding='utf-8-sig')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generates big synthetic datasets in the format of the shipped ones.')
+    parser.add_argument('--out', type=pathlib.Path, required=True, help='folder the datasets are written to')
+    parser.add_argument('--years', type=int, default=50, help='number of years of each dataset')
+    parser.add_argument('--regions', type=int, default=0, help='number of sub-national regions of every country')
+    parser.add_argument('--sub-indices', type=int, default=0, help='number of sub-index columns')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the random scores')
+    args = parser.parse_args()
+
+    args.out.mkdir(parents=True, exist_ok=True)
+    for name in dataset_files({key: index.file for key, index in INDICES.items()}):
+        df = generate(read_source(name), name, args.years, args.regions, args.sub_indices, args.seed)
+        write(df, args.out / name)
+        print('{}: {} rows'.format(args.out / name, len(df)))
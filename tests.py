@@ -1,16 +1,48 @@
+import fcntl
+import gzip
+import json
+import os
+import shutil
+import tempfile
+
 import pytest
 import dash_html_components as html
+import numpy as np
 import pandas as pd
 
-from generators import generate_table, generate_europe_map, generate_world_map
-from app import DATA_UN, DATA_EU
+from generators import generate_table, generate_map, figure_delta, payload_size
+from rankings import Rankings, COUNTRY, RANK, czech_key, decimal_scores
+from cache import FigureCache, ResultCache
+from datastore import DATA_PATH, load_dataset, build_store, ColumnStore, read_csv, store_path
+from benchmarks import compare, callback_body, panel_outputs
+from synthetic import generate, read_source, write
+from prerender import prerender
+from uncertainty import RankIntervals, sample_ranks
+import geometry
+from downloads import compressed_variant
+from ingest import ValidationError, ingest, validate
+from indices import INDICES, Index, register
+from memory import dataset_report, deep_size
+from app import DATA_UN, DATA_EU, DEFAULT_CONFIG, Dashboard, client_year_views, create_app
+
+df = load_dataset(DATA_UN)
+dfeu = load_dataset(DATA_EU)
+
+# The tests don't keep callback results and rank intervals in the store of the working tree, where
+# a later run could pass on results of an earlier one
+test_store = tempfile.TemporaryDirectory()
+TEST_CONFIG = {'CALLBACK_CACHE': '', 'RANK_INTERVALS': os.path.join(test_store.name, 'intervals'),
+               'RANK_SAMPLES': 200}
 
-df = pd.read_csv('data/{}'.format(DATA_UN))
-dfeu = pd.read_csv('data/{}'.format(DATA_EU))
+dashboard = Dashboard(dict(DEFAULT_CONFIG, **TEST_CONFIG))
 
 filtered_df = pd.DataFrame(df[df.Year == 2018], columns=['Czech name', 'eGov index']).reset_index()
 
 
+def make_app(config=None):
+    return create_app(dict(TEST_CONFIG, **(config or {})))
+
+
 # checks if the generate table function raises an exception when passed something else than a dataframe
 @pytest.mark.parametrize(
     "dataframe,max_rows",
@@ -43,13 +75,13 @@ def test_func_table(dataframe, max_rows):
 def test_func_worldmap(dataframe, year):
     if isinstance(year, int):
         try:
-            generate_world_map(dataframe, year)
+            generate_map(dataframe, year, 'un')
             assert True
         except Exception:
             assert False
     else:
         try:
-            generate_world_map(dataframe, year)
+            generate_map(dataframe, year, 'un')
             assert False
         except Exception:
             assert True
@@ -65,13 +97,565 @@ def test_func_worldmap(dataframe, year):
 def test_func_euromap(dataframe, year):
     if isinstance(dataframe, pd.DataFrame):
         try:
-            generate_europe_map(dataframe, year)
+            generate_map(dataframe, year, 'eu')
             assert True
         except Exception:
             assert False
     else:
         try:
-            generate_europe_map(dataframe, year)
+            generate_map(dataframe, year, 'eu')
             assert False
         except Exception:
             assert True
+
+
+# checks that the precomputed rankings match ranking a single year on its own
+@pytest.mark.parametrize(
+    "dataframe,column,year",
+    [
+        (df, 'UN eGov index', 2018),
+        (dfeu, 'EU eGov index', 2019)
+    ])
+def test_rankings(dataframe, column, year):
+    table = Rankings(dataframe, column, 'index').table(year)
+    single_year = decimal_scores(dataframe[dataframe.Year == year][column])
+    assert len(table) == len(single_year)
+    assert list(table['index'].dropna()) == sorted(single_year.dropna(), reverse=True)
+    assert list(table[RANK].dropna().sort_values()) == \
+        list(single_year.rank(method='max', ascending=False).dropna().sort_values())
+
+
+# checks that repeated figures come from the cache and that the oldest figures get evicted
+def test_figure_cache():
+    cache = FigureCache(max_entries=2)
+    first = cache.figure(generate_map, df, 'v1', 2018, index='un')
+    # A hit returns the stored figure without parsing it again
+    assert cache.figure(generate_map, df, 'v1', 2018, index='un') is first
+    assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 1
+    cache.figure(generate_map, df, 'v1', 2016, index='un')
+    cache.figure(generate_map, df, 'v1', 2014, index='un')
+    assert cache.stats()['entries'] == 2
+    cache.figure(generate_map, df, 'v1', 2018, index='un')
+    assert cache.stats()['misses'] == 4
+
+
+# checks that the years shipped to the browser carry the same data as the server callback
+def test_client_year_views():
+    views = client_year_views(dashboard, 'un')
+    assert sorted(views['years']) == [str(year) for year in dashboard.snapshot.rankings['un'].years]
+    figure, heading, table, *kpis = dashboard.panel_outputs('un', 2018, 'SVK')
+    assert views['years']['2018']['trace']['z'] == figure['data'][0]['z']
+    assert views['years']['2018']['outputs'][0] == heading
+    assert views['years']['2018']['kpis']['SVK'] == tuple(kpis)
+    ranking = views['years']['2018']['ranking']
+    assert len(ranking) == len(dashboard.snapshot.rankings['un'].table(2018))
+    assert ranking[0][RANK] == 1 and ranking[0]['Percentil'] == 100.0
+    assert all(views['years']['2018']['intervals'].get(code, '') == dashboard.rank_interval('un', 2018, code)
+               for code in ('CZE', 'SVK'))
+
+
+# checks that with the years switched in the browser, moving a slider asks the server for nothing
+def test_client_year_switching():
+    client = make_app({'YEAR_SWITCHING': 'client'}).server.test_client()
+    dependencies = client.get('/_dash-dependencies').get_json()
+    sliders = {index.slider for index in INDICES.values()}
+    server_side = [callback['output'] for callback in dependencies if callback.get('clientside_function') is None
+                   and any(dependency['id'] in sliders for dependency in callback['inputs'])]
+    assert server_side == []
+
+
+# checks that a map update carries only the year dependent data and is smaller than the full figure
+def test_figure_delta():
+    figure = FigureCache().figure(generate_map, df, 'v1', 2018, index='un')
+    delta = figure_delta(figure)
+    assert delta['trace']['z'] == figure['data'][0]['z']
+    assert 'geo' not in delta and 'colorscale' not in delta['trace']
+    assert payload_size(delta) < payload_size(figure)
+
+
+# checks that pages of the complete ranking follow the requested sort, with missing scores last
+@pytest.mark.parametrize("descending", [False, True])
+def test_rankings_page(descending):
+    rankings = Rankings(dfeu, 'EU eGov index', 'index')
+    pages = [rankings.page(2013, page, 10, 'index', descending) for page in range(rankings.page_count(2013, 10))]
+    scores = pd.concat(pages)['index']
+    assert len(scores) == len(rankings.table(2013))
+    assert list(scores.dropna()) == sorted(scores.dropna(), reverse=descending)
+    assert scores.tail(scores.isna().sum()).isna().all()
+
+
+# checks that the countries are sorted in the Czech alphabetical order and unknown columns in the ranking's order
+def test_rankings_country_order():
+    rankings = Rankings(dfeu, 'EU eGov index', 'index')
+    names = list(pd.concat([rankings.page(2019, page, 10, COUNTRY) for page in range(rankings.page_count(2019, 10))])[
+        COUNTRY])
+    assert names == sorted(names, key=czech_key)
+    assert names.index('Česká republika') < names.index('Dánsko') < names.index('Holandsko') < names.index('Chorvatsko')
+    assert names.index('Švédsko') < names.index('Turecko')
+    assert sorted(['Chile', 'Hongkong', 'Česko', 'Itálie'], key=czech_key) == ['Česko', 'Hongkong', 'Chile', 'Itálie']
+    assert rankings.page(2019, 0, 10, 'unknown').equals(rankings.page(2019, 0, 10))
+
+
+# checks that countries are looked up in numpy arrays, which the forked workers share, with the values of the table
+def test_rankings_lookup():
+    rankings = Rankings(dfeu, 'EU eGov index', 'index')
+    assert all(isinstance(values, np.ndarray) for values in rankings.values[2019] + (rankings.codes[2019],))
+    table = rankings.table(2019)
+    for code in ('CZE', 'MLT', 'USA'):
+        position = rankings.position(2019, code)
+        assert position is None if code == 'USA' else \
+            rankings.country(2019, code) == tuple(table[column].iloc[position] for column in (RANK, 'index', 'Percentil'))
+
+
+# checks that the table shows the first rows with the float columns rounded
+def test_table_values():
+    table = generate_table(pd.DataFrame({'name': ['a', 'b', 'c'], 'score': [0.12345, 0.5, 0.25]}), 2)
+    rows = table.children[1].children
+    assert len(rows) == 2
+    assert [cell.children for cell in rows[0].children] == ['a', 0.12]
+
+
+# checks that the columnar store gives back the same data as the CSV file, in compact types
+def test_column_store():
+    store = ColumnStore(build_store(DATA_EU))
+    assert store.is_current()
+    frame = store.to_frame()
+    pd.testing.assert_frame_equal(frame, read_csv(DATA_EU))
+    assert frame['Year'].dtype == 'int16' and frame['EU eGov index'].dtype == 'float32'
+    assert frame['Czech name'].dtype == 'category'
+    # The columns are the memory-mapped files, not copies of them
+    for column in frame.columns:
+        values = frame[column].cat.codes.to_numpy() if frame[column].dtype == 'category' else frame[column].to_numpy()
+        while not isinstance(values, np.memmap):
+            values = values.base
+            assert values is not None, column
+
+
+# checks that creating the app loads no data and that warming up prebuilds the figures of all years
+def test_create_app():
+    app = make_app({'FOCUS_COUNTRY': 'SVK'})
+    assert app.dashboard._snapshot is None
+    app.dashboard.warm_up()
+    assert app.dashboard.figure_cache.stats()['entries'] == \
+        len(app.dashboard.snapshot.rankings['un'].years) + len(app.dashboard.snapshot.rankings['eu'].years) + \
+        len(app.dashboard.snapshot.comparison.years('un', 'eu'))
+    assert app.dashboard.panel_outputs('un', 2018)[3] == '50. místo'
+
+
+# checks that the values of any country are looked up by its ISO code and that the URL can choose the country
+@pytest.mark.parametrize(
+    "search,values",
+    [
+        ('', ('54. místo', '0.708', '72.5%')),
+        ('?country=svk', ('50. místo', '0.716', '74.9%')),
+        ('?country=XXX', ('54. místo', '0.708', '72.5%'))
+    ])
+def test_focus_country(search, values):
+    code = dashboard.focus_country(search)
+    assert dashboard.focus_kpis(dashboard.snapshot.rankings['un'], 2018, code) == values
+    assert dashboard.focus_kpis(dashboard.snapshot.rankings['eu'], 2018, 'USA') == ('–', '–', '–')
+
+
+# checks that a compressed file is made again when its file is replaced, even by one with an older mtime
+def test_compressed_variant(tmp_path):
+    path = tmp_path / 'data.csv'
+    path.write_text('a,b\n1,2\n')
+    variant = compressed_variant(path, 'gzip', '.gz', tmp_path / 'downloads')
+    assert gzip.decompress(variant.read_bytes()) == b'a,b\n1,2\n'
+    stat = path.stat()
+    path.write_text('a,b\n3,4\n')
+    os.utime(str(path), ns=(stat.st_atime_ns, stat.st_mtime_ns - 10 ** 9))
+    variant = compressed_variant(path, 'gzip', '.gz', tmp_path / 'downloads')
+    assert gzip.decompress(variant.read_bytes()) == b'a,b\n3,4\n'
+
+
+# checks that only the CSV files of the data folder can be downloaded, compressed and conditionally
+@pytest.mark.parametrize(
+    "path,status",
+    [
+        ('/data/eur-t3.csv', 200),
+        ('/data/x/../eur-t3.csv', 200),
+        ('/data/../app.py', 404),
+        ('/data/%2e%2e/app.py', 404),
+        ('/data/missing.csv', 404)
+    ])
+def test_download(path, status):
+    client = make_app().server.test_client()
+    response = client.get(path, headers={'Accept-Encoding': 'gzip'})
+    assert response.status_code == status
+    if status == 200:
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert response.headers['Content-Disposition'] == 'attachment; filename="eur-t3.csv"'
+        revalidated = client.get(path, headers={'Accept-Encoding': 'gzip',
+                                                'If-None-Match': response.headers['ETag']})
+        assert revalidated.status_code == 304
+        assert client.get(path, headers={'Range': 'bytes=0-9'}).status_code == 206
+
+
+# checks that the export streams only the rows of the requested year and region
+def test_export():
+    client = make_app().server.test_client()
+    rows = client.get('/export/un.csv?year=2018&region=eu28').get_data(as_text=True).splitlines()
+    expected = df[(df.Year == 2018) & (df.EU28 == 1)]
+    assert len(rows) == len(expected) + 1
+    assert rows[1].startswith(expected['Czech name'].iloc[0])
+    assert client.get('/export/un.csv?region=mars').status_code == 400
+    assert client.get('/export/un.csv?year=2018&year=abc').status_code == 400
+
+
+# checks that only slowdowns and payload growth beyond the threshold count as benchmark regressions
+def test_benchmark_compare():
+    baseline = {'callback': {'ms': 10, 'bytes': 1000}, 'tiny': {'ms': 0.01}}
+    assert compare({'callback': {'ms': 12, 'bytes': 1100}, 'tiny': {'ms': 0.1}}, baseline, 0.3) == []
+    assert len(compare({'callback': {'ms': 14, 'bytes': 1400}}, baseline, 0.3)) == 2
+
+
+# checks that the synthetic datasets have the shipped columns and load into the app
+def test_synthetic(tmp_path):
+    for name in (DATA_UN, DATA_EU):
+        source = read_source(name)
+        generated = generate(source, name, years=12, regions=2, sub_indices=2)
+        assert list(generated.columns[:len(source.columns)]) == list(source.columns)
+        assert len(generated) == 12 * 3 * source['Code'].nunique()
+        write(generated, tmp_path / name)
+    app = make_app({'DATA_DIR': str(tmp_path)})
+    assert len(app.dashboard.snapshot.rankings['un'].years) == 12
+    assert app.server.test_client().get('/data/{}'.format(DATA_EU)).status_code == 200
+
+
+# checks that requests and callbacks are timed and reported on /metrics together with the cache counters
+def test_metrics():
+    app = make_app()
+    client = app.server.test_client()
+    client.get('/data/{}'.format(DATA_EU))
+    client.post('/_dash-update-component', json=callback_body(
+        panel_outputs(('un-map-delta', 'data'), 'un'), [('year-slider', 'value', 2016), ('url', 'search', '')]))
+    text = client.get('/metrics').get_data(as_text=True)
+    assert 'egov_request_duration_seconds_count{route="/data/<path:path>"} 1' in text
+    assert 'egov_callback_duration_seconds_bucket{callback="..un-map-delta.data...' in text
+    assert 'egov_figure_cache_misses_total' in text
+    assert 'egov_memory_bytes{pid=' in text
+    assert 'egov_dataset_bytes{index="un",part="rankings"}' in text
+    # Without metrics the path is left to the Dash page
+    assert b'egov_' not in make_app({'METRICS': False}).server.test_client().get('/metrics').data
+
+
+# checks that the loaded data are compact and every part of the memory report is counted once
+def test_dataset_report():
+    snapshot = make_app().dashboard.snapshot
+    un = snapshot.data['un']
+    assert un['Code'].dtype.name == 'category' and un['Year'].dtype == np.int16
+    assert un['UN eGov index'].dtype == np.float32
+    report = dataset_report(snapshot)
+    assert report['un']['rows'] == len(un) and report['un']['years'] == len(snapshot.rankings['un'].years)
+    assert report['un']['data'] == deep_size(un) < un.astype({'Code': str, 'Year': int}).memory_usage(deep=True).sum()
+    # Objects met before count nothing
+    seen = set()
+    assert deep_size(snapshot.rankings['un'], seen) > 0 and deep_size(snapshot.rankings['un'], seen) == 0
+
+
+# checks the JSON API against the rankings and its revalidation by the version of the data
+def test_api():
+    app = make_app()
+    client = app.server.test_client()
+    rankings = app.dashboard.snapshot.rankings['un']
+    response = client.get('/api/v1/un/ranking/2018')
+    countries = response.get_json()['countries']
+    assert response.headers['Cache-Control'] == 'public, max-age=300'
+    assert len(countries) == len(rankings.table(2018))
+    assert countries[0]['rank'] == 1 and countries[0]['score'] == rankings.table(2018).iloc[0, 2]
+    assert client.get('/api/v1/un/ranking/2018', headers={'If-None-Match': response.headers['ETag']}).status_code == 304
+
+    top = client.get('/api/v1/un/top/2018?region=eu28&n=5').get_json()['countries']
+    eu28 = set(app.dashboard.snapshot.data['un'].query('EU28 == 1')['Code'])
+    assert [country['region_rank'] for country in top] == [1, 2, 3, 4, 5]
+    assert all(country['code'] in eu28 for country in top) and top == sorted(top, key=lambda c: c['rank'])
+    assert client.get('/api/v1/un/top/2018?region=asia').status_code == 400
+
+    assert countries[0]['percentile'] == 100.0 and isinstance(countries[-1]['percentile'], float)
+    series = client.get('/api/v1/eu/country/cze').get_json()['series']
+    assert series[-1]['rank'] == app.dashboard.snapshot.rankings['eu'].country(series[-1]['year'], 'CZE')[0]
+    for url in ('/api/v1/un/ranking/1990', '/api/v1/un/country/XXX', '/api/v1/osi/country/CZE'):
+        response = client.get(url)
+        assert response.status_code == 404 and 'error' in response.get_json()
+
+
+# checks that changed data files are loaded into a new snapshot while the old one stays intact
+def test_reload(tmp_path):
+    for name in (DATA_UN, DATA_EU):
+        shutil.copy(str(DATA_PATH / name), str(tmp_path / name))
+    dashboard = make_app({'DATA_DIR': str(tmp_path)}).dashboard
+    old = dashboard.snapshot
+    assert not dashboard.reload()
+
+    eu = pd.read_csv(tmp_path / DATA_EU, encoding='utf-8-sig')
+    eu.loc[eu.Code == 'CZE', 'EU eGov index'] = 99
+    eu.to_csv(tmp_path / DATA_EU, index=False, encoding='utf-8-sig')
+    # The new data are in use while their rank intervals are computed
+    computed = []
+    compute = dashboard.compute_rank_intervals
+    dashboard.compute_rank_intervals = lambda snapshot: computed.append(snapshot is dashboard.snapshot) or \
+        compute(snapshot)
+    assert dashboard.reload()
+    assert computed == [True]
+    assert dashboard.snapshot is not old
+    assert dashboard.snapshot.versions['eu'] != old.versions['eu']
+    assert dashboard.snapshot.versions['un'] == old.versions['un']
+    assert dashboard.focus_kpis(dashboard.snapshot.rankings['eu'], 2019, 'CZE')[1] == '99.0'
+    assert old.rankings['eu'].country(2019, 'CZE')[1] != 99
+
+    (tmp_path / DATA_UN).write_text('broken')
+    with pytest.raises(Exception):
+        dashboard.reload()
+    # The broken file is not read again until it changes, the last good data stay in use
+    assert not dashboard.reload()
+    assert dashboard.snapshot.versions['un'] == old.versions['un']
+
+
+# checks that callback results are shared through the file, expire and are evicted least recently used first
+def test_result_cache(tmp_path):
+    path = tmp_path / 'callbacks.sqlite'
+    calls = []
+
+    def compute(value):
+        calls.append(value)
+        return {'value': value, 'padding': 'x' * 100}
+
+    cache = ResultCache(path, ttl=60, max_bytes=300)
+    assert cache.get(['callback', 1], lambda: compute(1)) == compute(1)
+    # Another process opening the same file gets the stored result
+    other = ResultCache(path, ttl=60, max_bytes=300)
+    assert other.get(['callback', 1], lambda: compute(2))['value'] == 1
+    assert other.stats() == {'hits': 1, 'misses': 0}
+
+    cache.get(['callback', 2], lambda: compute(2))
+    cache.get(['callback', 3], lambda: compute(3))
+    calls.clear()
+    assert cache.get(['callback', 1], lambda: compute(1))['value'] == 1
+    assert calls == [1]
+
+    expired = ResultCache(path, ttl=0)
+    expired.get(['callback', 3], lambda: compute(3))
+    assert expired.stats()['misses'] == 1
+
+
+# checks that an app serving a pre-rendered bundle shows the same panels as one computing them
+def test_prerender(tmp_path):
+    bundle = tmp_path / 'bundle'
+    # A folder without a manifest is no bundle, e.g. while the first one is being written
+    bundle.mkdir()
+    assert make_app({'BUNDLE': str(bundle)}).dashboard.bundled_outputs('un', dashboard.snapshot.versions['un'],
+                                                                       2018, None) is None
+
+    written = []
+    manifest = prerender(bundle, dict(DEFAULT_CONFIG), processes=2,
+                         progress=lambda panel, year: written.append((panel, year)))
+    assert manifest['years']['un'] == [int(year) for year in dashboard.snapshot.rankings['un'].years]
+    assert len(written) == len(manifest['years']['un']) + len(manifest['years']['eu'])
+    assert (bundle / 'eu' / '2019.json').exists() and not (tmp_path / 'bundle.building').exists()
+
+    bundled = make_app({'BUNDLE': str(bundle)}).dashboard
+    assert bundled.bundle.view('un', dashboard.snapshot.versions['un'], 2018, {'resolution': 110}) is not None
+    for year, country in [(2018, 'SVK'), (2005, 'USA')]:
+        assert payload_size(bundled.panel_outputs('un', year, country)) == \
+            payload_size(dashboard.panel_outputs('un', year, country))
+    assert bundled.panel_outputs('eu', 2019, 'USA')[3:] == ('–', '–', '–')
+    # A bundle of other data is ignored
+    assert bundled.bundle.view('un', 'other', 2018, {'resolution': 110}) is None
+    # So are maps drawn at another resolution than the app's
+    assert make_app({'BUNDLE': str(bundle), 'WORLD_RESOLUTION': 50}).dashboard.panel_outputs('un', 2018)[0][
+        'layout']['geo']['resolution'] == 50
+    # A bundle swapped for another one is read anew
+    (bundle / 'manifest.json').write_text('{"versions": {}, "years": {}}', encoding='utf-8')
+    assert bundled.bundle.view('un', dashboard.snapshot.versions['un'], 2018, {'resolution': 110}) is None
+
+
+# checks that the comparison ranks countries among those scored by both indices, in the years both have
+def test_comparison():
+    comparison = dashboard.snapshot.comparison
+    assert comparison.years('un', 'eu') == [2014, 2016, 2018]
+    view = comparison.view(2018, 'un', 'eu')
+    common = set(df[df.Year == 2018].Code) & set(dfeu[dfeu.Year == 2018].Code)
+    assert set(view['codes']) == common
+    assert min(view['rank_x']) == 1 and max(view['rank_y']) <= len(common)
+    assert view['rank_difference'] == [x - y for x, y in zip(view['rank_x'], view['rank_y'])]
+    assert abs(view['rank_difference'][0]) == max(abs(difference) for difference in view['rank_difference'])
+    assert -1 <= view['correlation'] <= 1
+    assert comparison.view(2020, 'un', 'eu') is None
+    figure, table = dashboard.comparison_outputs(2016)
+    assert figure['data'][0]['type'] == 'scatter'
+    assert len(table.children[1].children) == 10
+
+
+# checks that the country x year pivot holds the scores and ranks of the long dataset
+def test_trends():
+    trends = dashboard.snapshot.trends['un']
+    years, scores, ranks = trends.trend('CZE')
+    assert list(years) == sorted(df.Year.unique())
+    cze = df[df.Code == 'CZE'].set_index('Year')['UN eGov index']
+    assert [round(score, 4) for score in scores] == [round(float(cze.get(year)), 4) for year in years]
+    assert ranks[list(years).index(2018)] == 54
+    assert trends.trend('XXX') is None
+    figure = dashboard.trend_figure('eu', 'XXX')
+    assert figure.layout.title.text.endswith('Česká republika')
+
+
+# checks that local map geometry is served compressed under a fingerprinted, long cached URL
+def test_geometry(tmp_path, monkeypatch):
+    assert make_app().dashboard.geometry == ['world_110m.json', 'europe_50m.json']
+    monkeypatch.setattr(geometry, 'TOPOJSON_PATH', tmp_path)
+    monkeypatch.setattr(geometry, 'STORE_PATH', tmp_path / 'store')
+    assert make_app().dashboard.graph_config == {}
+
+    for name in ('world_110m.json', 'europe_50m.json'):
+        (tmp_path / name).write_text('{"type": "Topology", "name": "%s"}' % name)
+    app = make_app()
+    url = app.dashboard.graph_config['topojsonURL']
+    assert url.startswith('/topojson/')
+    client = app.server.test_client()
+    response = client.get(url + 'world_110m.json', headers={'Accept-Encoding': 'gzip'})
+    assert response.status_code == 200
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'immutable' in response.headers['Cache-Control']
+    assert client.get(url + 'world_50m.json').status_code == 404
+    assert app.dashboard.panel_outputs('un', 2018)[0]['layout']['geo']['resolution'] == 110
+
+
+# checks that apps sharing the callback cache don't get each other's maps drawn at another resolution
+def test_callback_cache_resolution(tmp_path):
+    body = callback_body(panel_outputs(('world-map-with-slider', 'figure'), 'un'),
+                         [('year-slider', 'value', 2016), ('url', 'search', '')])
+    for resolution in (110, 50):
+        app = make_app({'MAP_UPDATES': 'full', 'WORLD_RESOLUTION': resolution,
+                        'CALLBACK_CACHE': str(tmp_path / 'callbacks.sqlite')})
+        response = app.server.test_client().post('/_dash-update-component', json=body).get_json()
+        assert response['response']['world-map-with-slider']['figure']['layout']['geo']['resolution'] == resolution
+
+
+# checks that the rank intervals contain the exact ranks and are computed once per dataset version
+def test_rank_intervals(tmp_path):
+    ranks = sample_ranks(np.array([0.9, 0.5, 0.7]), 0.0, 4, 0)
+    assert ranks.tolist() == [[1, 3, 2]] * 4
+
+    intervals = RankIntervals(tmp_path, samples=300)
+    snapshot = dashboard.snapshot
+    computed = intervals.compute(snapshot.versions['un'], snapshot.data['un'], 'UN eGov index')
+    inside = [low <= snapshot.rankings['un'].country(2018, code)[0] <= high
+              for code, (low, high) in computed[2018].items()]
+    assert sum(inside) >= 0.95 * len(inside)
+    low, high = computed[2018]['CZE']
+    assert low < 54 < high
+    # Another process reads them from the store
+    assert RankIntervals(tmp_path, samples=300).get(snapshot.versions['un']) == computed
+    # Looking up intervals nobody has computed yet doesn't compute them
+    assert intervals.get('unknown') is None and not intervals.file('unknown').exists()
+    # While another process holds the lock of a version, it is left to that process
+    with open(intervals.file('other').with_suffix('.lock'), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        assert intervals.compute('other', snapshot.data['un'], 'UN eGov index') is None
+    version = snapshot.versions['un']
+    assert RankIntervals(tmp_path, samples=100).file(version) != intervals.file(version)
+
+
+# checks that a new year is validated, appended to the CSV and the store, and ranked alone on reload
+def test_ingest(tmp_path):
+    for name in (DATA_UN, DATA_EU):
+        shutil.copy(str(DATA_PATH / name), str(tmp_path / name))
+        build_store(name, tmp_path)
+    dashboard = make_app({'DATA_DIR': str(tmp_path)}).dashboard
+    old = dashboard.snapshot
+
+    new = df[df.Year == 2020].assign(Year=2022)
+    new['UN eGov index'] = (new['UN eGov index'] * 0.99).round(4)
+    bad = pd.concat([new, new.head(1)]).astype({'Czech name': str, 'Code': str}).reset_index(drop=True)
+    bad.loc[1, ['Czech name', 'Code', 'UN eGov index']] = ['Test', 'AND', 3]
+    bad.to_csv(tmp_path / 'bad.csv', index=False, encoding='utf-8-sig')
+    with pytest.raises(ValidationError) as error:
+        ingest(tmp_path / 'bad.csv', DATA_UN, tmp_path)
+    assert any('out of the range' in e for e in error.value.errors)
+    assert any('duplicate country code' in e for e in error.value.errors)
+    # A country new to the dataset is only a warning, returned to the caller
+    new.assign(Code=new['Code'].astype(str).where(new['Code'] != 'AND', 'XKX')).to_csv(
+        tmp_path / 'new-country.csv', index=False, encoding='utf-8-sig')
+    assert validate(tmp_path / 'new-country.csv', DATA_UN, tmp_path) == ['Countries new to the dataset: XKX']
+    new.to_csv(tmp_path / 'no-bom.csv', index=False, encoding='utf-8')
+    with pytest.raises(ValidationError):
+        ingest(tmp_path / 'no-bom.csv', DATA_UN, tmp_path)
+    assert not dashboard.reload()
+
+    new.to_csv(tmp_path / 'new.csv', index=False, encoding='utf-8-sig')
+    assert ingest(tmp_path / 'new.csv', DATA_UN, tmp_path) == (len(new), [])
+    # The appended store is the one a full rebuild would make
+    assert ColumnStore(store_path(DATA_UN, tmp_path), tmp_path).is_current()
+    pd.testing.assert_frame_equal(load_dataset(DATA_UN, tmp_path), read_csv(DATA_UN, tmp_path))
+    with pytest.raises(ValidationError):
+        ingest(tmp_path / 'new.csv', DATA_UN, tmp_path)
+
+    assert dashboard.reload()
+    snapshot = dashboard.snapshot
+    assert snapshot.rankings['un'].years[-1] == 2022
+    assert snapshot.rankings['un'].tables[2018] is old.rankings['un'].tables[2018]
+    assert snapshot.year_versions['un'][2018] == old.year_versions['un'][2018]
+    assert snapshot.rankings['un'].country(2022, 'CZE') is not None
+
+
+# checks that the layout is served from its serialized payload, compressed and revalidated with its ETag
+def test_layout_payload(tmp_path):
+    for name in (DATA_UN, DATA_EU):
+        shutil.copy(str(DATA_PATH / name), str(tmp_path / name))
+    app = make_app({'DATA_DIR': str(tmp_path)})
+    client = app.server.test_client()
+    response = client.get('/_dash-layout')
+    assert response.status_code == 200
+    assert json.loads(response.data)['type'] == 'Div'
+    etag = response.headers['ETag']
+    assert client.get('/_dash-layout', headers={'If-None-Match': etag}).status_code == 304
+    compressed = client.get('/_dash-layout', headers={'Accept-Encoding': 'gzip'})
+    assert compressed.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(compressed.data) == response.data
+    assert compressed.headers['ETag'] != etag
+
+    # Reloaded data make a new layout with another ETag
+    eu = pd.read_csv(tmp_path / DATA_EU, encoding='utf-8-sig')
+    eu.loc[eu.Code == 'CZE', 'EU eGov index'] = 99
+    eu.to_csv(tmp_path / DATA_EU, index=False, encoding='utf-8-sig')
+    assert app.dashboard.reload()
+    assert client.get('/_dash-layout', headers={'If-None-Match': etag}).status_code == 200
+
+
+# checks that a registered index gets a panel from the shared pipeline, sharing the dataframe of its file
+def test_index_registry(tmp_path):
+    for name in (DATA_UN, DATA_EU):
+        write(generate(read_source(name), name, years=3, sub_indices=2), tmp_path / name)
+    register(Index(key='osi', file=DATA_UN, value_column='UN eGov index 1', score_range=(0.0, 1.0),
+                   label='index OSI', digits=3, scale=(0, 1), scope='world', resolution='WORLD_RESOLUTION',
+                   name='OSI', title='Index online služeb', map_title=' Index online služeb z roku ',
+                   table_title='TOP 15 zemí v roce ', source='OSN'))
+    try:
+        # The synthetic scores stay in the registered ranges
+        for index in INDICES.values():
+            assert read_csv(index.file, tmp_path)[index.value_column].between(*index.score_range).all()
+        app = make_app({'DATA_DIR': str(tmp_path), 'INDICES': ['un', 'eu', 'osi'], 'RANK_SAMPLES': 0})
+        snapshot = app.dashboard.snapshot
+        assert snapshot.data['osi'] is snapshot.data['un']
+        client = app.server.test_client()
+        assert b'"osi-map"' in client.get('/_dash-layout').data
+        response = client.post('/_dash-update-component', json=callback_body(
+            panel_outputs(('osi-map-delta', 'data'), 'osi'),
+            [('osi-year-slider', 'value', 2019), ('url', 'search', '')]))
+        assert response.status_code == 200
+        df = snapshot.data['osi']
+        assert app.dashboard.panel_outputs('osi', 2019)[0]['data'][0]['z'] == \
+            df[df.Year == 2019]['UN eGov index 1'].astype('float64').round(4).tolist()
+        assert snapshot.rankings['osi'].label == 'index OSI'
+
+        # A new year is checked against the range of the registered index too
+        new = read_csv(DATA_UN, tmp_path).astype({'Czech name': str, 'English name': str, 'Code': str})
+        new = new[new.Year == new.Year.max()].assign(Year=2030)
+        new['UN eGov index 1'] = new['UN eGov index 1'] + 2
+        new.to_csv(tmp_path / 'new.csv', index=False, encoding='utf-8-sig')
+        with pytest.raises(ValidationError) as error:
+            validate(tmp_path / 'new.csv', DATA_UN, tmp_path)
+        assert all('UN eGov index 1' in e and 'out of the range' in e for e in error.value.errors)
+    finally:
+        INDICES.pop('osi')
@@ -0,0 +1,36 @@
+import numpy as np
+
+from rankings import decimal_scores
+
+
+class Trends:
+    """Score and rank of every country in every year of one dataset, held as dense country x year arrays.
+
+    The arrays are filled once, when the data are loaded, so the trend of a country is a
+    dictionary lookup of its row instead of filtering the dataset. Years in which a country
+    wasn't ranked hold NaN.
+    """
+
+    def __init__(self, df, value_column):
+        codes = df['Code'].astype(str).to_numpy()
+        years = df['Year'].astype(int).to_numpy()
+        self.codes = np.unique(codes)
+        self.years = np.unique(years)
+        self.rows = {code: row for row, code in enumerate(self.codes)}
+
+        rows = np.searchsorted(self.codes, codes)
+        columns = np.searchsorted(self.years, years)
+        self.scores = np.full((len(self.codes), len(self.years)), np.nan)
+        self.scores[rows, columns] = decimal_scores(df[value_column]).to_numpy('float64')
+        self.ranks = np.full(self.scores.shape, np.nan)
+        self.ranks[rows, columns] = df.groupby('Year')[value_column].rank(method='max', ascending=False).to_numpy()
+        # Shared by all requests, nothing may change them
+        self.scores.setflags(write=False)
+        self.ranks.setflags(write=False)
+
+    def trend(self, code):
+        """Returns the years, scores and ranks of the country with the ISO code, None for an unknown country."""
+        row = self.rows.get(code)
+        if row is None:
+            return None
+        return self.years, self.scores[row], self.ranks[row]
@@ -0,0 +1,146 @@
+"""Confidence intervals of the ranks, from scores perturbed by noise many times over.
+
+Neighbouring countries often differ in thousandths of the index, so their exact ranks mean
+little. Every score of a year is perturbed by normal noise in a batch of samples at once, the
+countries are ranked in each sample, and the 2.5th and 97.5th percentile of the ranks of a
+country form its 95% interval. The batches of all years are computed in a process pool.
+
+The intervals are computed by the warm-up and the reload of the app, or by `python uncertainty.py`
+for an app running without the warm-up; requests only read the finished ones.
+"""
+import argparse
+import concurrent.futures
+import json
+import logging
+import multiprocessing
+import os
+import pathlib
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Not on Windows, the processes there don't agree on who computes the intervals
+    fcntl = None
+
+# Standard deviation of the noise, as a fraction of the range of the index's scores
+NOISE = 0.005
+
+# Number of perturbed samples of every year, and how many of them one task ranks at once
+SAMPLES = 1000
+BATCH = 250
+
+logger = logging.getLogger(__name__)
+
+
+def sample_ranks(scores, sigma, samples, seed):
+    """Returns the ranks of the scores (best first) in each of the samples perturbed by the noise, samples x scores."""
+    rng = np.random.default_rng(seed)
+    perturbed = scores + rng.normal(0.0, sigma, (samples, len(scores)))
+    ranks = np.empty(perturbed.shape, dtype=np.int16)
+    order = np.argsort(-perturbed, axis=1)
+    np.put_along_axis(ranks, order, np.arange(1, len(scores) + 1, dtype=np.int16)[np.newaxis, :], axis=1)
+    return ranks
+
+
+def rank_intervals(df, value_column, samples=SAMPLES, noise=NOISE, processes=None):
+    """Returns the 95% rank interval of every country in every year, {year: {code: (low, high)}}."""
+    scores = df[value_column].to_numpy('float64')
+    sigma = noise * (np.nanmax(scores) - np.nanmin(scores))
+    years = {}
+    for year, rows in df.groupby('Year').indices.items():
+        rows = rows[~np.isnan(scores[rows])]
+        if len(rows):
+            years[int(year)] = rows
+
+    # The pool is started fresh rather than forked, the app computes the intervals from its data-watcher
+    # thread and a fork of a process running other threads may inherit locks held by them
+    with concurrent.futures.ProcessPoolExecutor(processes, mp_context=multiprocessing.get_context('spawn')) as pool:
+        # Every batch has its own seed, so the results don't depend on how the batches are scheduled
+        batches = {(year, start): pool.submit(sample_ranks, scores[rows], sigma, min(BATCH, samples - start),
+                                              [year, start])
+                   for year, rows in years.items() for start in range(0, samples, BATCH)}
+        intervals = {}
+        for year, rows in years.items():
+            ranks = np.concatenate([batches[(year, start)].result() for start in range(0, samples, BATCH)])
+            low, high = np.percentile(ranks, [2.5, 97.5], axis=0, method='nearest')
+            codes = df['Code'].to_numpy()[rows]
+            intervals[year] = {str(code): (int(lo), int(hi)) for code, lo, hi in zip(codes, low, high)}
+    return intervals
+
+
+class RankIntervals:
+    """Rank intervals of the datasets by their version, kept on disk.
+
+    The intervals of a dataset version are computed once, by the one process holding the lock
+    file of the version, and read by all the others. Looking them up never computes anything.
+    """
+
+    def __init__(self, path, samples=SAMPLES, noise=NOISE, processes=None):
+        self.path = pathlib.Path(path)
+        self.samples = samples
+        self.noise = noise
+        self.processes = processes
+        self._intervals = {}
+
+    def file(self, version):
+        return self.path / '{}-{}-{}.json'.format(version, self.samples, self.noise)
+
+    def get(self, version):
+        """Returns the intervals of the dataset version, None until some process has computed them."""
+        return self._intervals.get(version) or self._load(version)
+
+    def compute(self, version, df, value_column):
+        """Returns the intervals of the dataset version, computing them now if no process has done it yet.
+
+        Returns None when another process is computing them, they are then read once it has finished.
+        """
+        intervals = self.get(version)
+        if intervals is not None:
+            return intervals
+        self.path.mkdir(parents=True, exist_ok=True)
+        with open(self.file(version).with_suffix('.lock'), 'w') as lock:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    return None
+            # The process that held the lock before may have finished them meanwhile
+            intervals = self.get(version)
+            if intervals is None:
+                intervals = rank_intervals(df, value_column, self.samples, self.noise, self.processes)
+                self._store(version, intervals)
+        return intervals
+
+    def _load(self, version):
+        file = self.file(version)
+        if not file.exists():
+            return None
+        intervals = {int(year): {code: tuple(interval) for code, interval in codes.items()}
+                     for year, codes in json.loads(file.read_text(encoding='utf-8')).items()}
+        self._intervals[version] = intervals
+        return intervals
+
+    def _store(self, version, intervals):
+        file = self.file(version)
+        partial = file.with_name('{}.{}.tmp'.format(file.name, os.getpid()))
+        partial.write_text(json.dumps(intervals), encoding='utf-8')
+        partial.replace(file)
+        self._intervals[version] = intervals
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Computes the rank intervals of the current data into the store.')
+    parser.parse_args()
+
+    from app import DEFAULT_CONFIG, Dashboard, interval_version
+    from indices import INDICES
+    dashboard = Dashboard(dict(DEFAULT_CONFIG))
+    if dashboard.rank_intervals is None:
+        raise SystemExit('The rank intervals are turned off by EGOV_RANK_SAMPLES=0')
+    snapshot = dashboard.snapshot
+    for key, df in snapshot.data.items():
+        version = interval_version(snapshot, key)
+        intervals = dashboard.rank_intervals.compute(version, df, INDICES[key].value_column)
+        print('{}: {}'.format(dashboard.rank_intervals.file(version),
+                              'ready' if intervals is not None else 'being computed by another process'))